@@ -0,0 +1,241 @@
+# -*- coding:utf-8 -*-
+
+# Copyright © 2017 Kiri Choi
+# Licensed under the terms of the MIT License
+
+"""
+Import latency benchmarks
+
+    python benchmarks/bench_import.py run -o before.json
+    python benchmarks/bench_import.py run -o after.json
+    python benchmarks/bench_import.py compare before.json after.json
+
+Every (size, action) pair is measured in a fresh process so that peak memory
+figures are not polluted by earlier runs. Editor creation needs a running
+Spyder and is not covered here
+"""
+
+from __future__ import print_function, division
+
+import os, sys, time
+import json
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+import multiprocessing
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from spyder_teimport import translate
+from spyder_teimport.archive import CombineArchive
+from spyder_teimport.backends import tellurium, phrasedml
+from spyder_teimport.cache import TranslationCache
+from spyder_teimport.rewrite import LineRewriter, InlineModels, dropsavefig
+
+import corpus
+
+ACTIONS = ('c2p', 'c2pwp', 's2p', 's2pwp')
+
+
+class Stages(object):
+    """Accumulates the wall time of named stages"""
+    def __init__(self):
+        self.times = defaultdict(float)
+
+    def timed(self, name, func, *args):
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            self.times[name] += time.perf_counter() - start
+
+def dirsize(path):
+    total = 0
+    if path is None:
+        return total
+    for root, dirs, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+#Times the stages of an archive import, mirroring Translatecombine2P/2WP
+def archivestages(path, action):
+    stages = Stages()
+    archive = stages.timed('open', CombineArchive, path)
+    stages.timed('hash', translate.combinekey, action, path, archive)
+    models = translate.ModelSet(archive)
+    for sedmlloc in archive.sedmlloclist:
+        sources = stages.timed('resolve', models.sources, sedmlloc)
+        for source, sbmlloc in sources:
+            stages.timed('sbmlToAntimony', models.antimony, sbmlloc)
+        sedmlpath = stages.timed('extract', archive.sedmlpath, sedmlloc)
+        if action == 'c2p':
+            text = stages.timed('sedmlToPython', tellurium().sedmlToPython, sedmlpath)
+            rewriter = LineRewriter([dropsavefig, InlineModels(sources, models.definer(action))])
+            stages.timed('rewrite', rewriter.rewrite, text)
+        else:
+            stages.timed('convertFile', phrasedml().convertFile, sedmlpath)
+    tempdisk = dirsize(archive._tempdir)
+    stages.timed('cleanup', archive.close)
+    return stages.times, tempdisk
+
+#Times the stages of a SED-ML import
+def sedmlstages(path, action):
+    stages = Stages()
+    stages.timed('hash', translate.sedmlkey, action, path)
+    if action == 's2p':
+        stages.timed('sedmlToPython', tellurium().sedmlToPython, path)
+    else:
+        stages.timed('convertFile', phrasedml().convertFile, path)
+    return stages.times, 0
+
+def measure(size, action, path, repeat):
+    """Run in a child process: return the measurements of one case"""
+    import tracemalloc
+    try:
+        import resource
+    except ImportError:
+        resource = None
+    cachedir = tempfile.mkdtemp()
+    translate._cache = TranslationCache(cachedir)
+    result = {'size': size, 'action': action, 'input': os.path.basename(path),
+              'input_mb': os.path.getsize(path) / 1048576., 'errors': []}
+    try:
+        # Import the backends up front so their cost is not charged to a stage
+        start = time.perf_counter()
+        tellurium(), phrasedml()
+        result['backend_import'] = time.perf_counter() - start
+        stagefunc = archivestages if action in ('c2p', 'c2pwp') else sedmlstages
+        best = None
+        for i in range(repeat):
+            times, tempdisk = stagefunc(path, action)
+            if best is None or sum(times.values()) < sum(best.values()):
+                best = times
+        result['stages'] = dict(best)
+        result['temp_disk_mb'] = tempdisk / 1048576.
+        tracemalloc.start()
+        totals = []
+        for i in range(repeat):
+            start = time.perf_counter()
+            translate.translatefile(path, action, usecache=False)
+            totals.append(time.perf_counter() - start)
+        result['peak_python_mb'] = tracemalloc.get_traced_memory()[1] / 1048576.
+        tracemalloc.stop()
+        result['total'] = min(totals)
+        translate.translatefile(path, action, usecache=True)
+        start = time.perf_counter()
+        translate.translatefile(path, action, usecache=True)
+        result['cached'] = time.perf_counter() - start
+    except Exception as e:
+        result['errors'].append('%s: %s' % (type(e).__name__, e))
+    finally:
+        shutil.rmtree(cachedir, ignore_errors=True)
+    if resource is not None:
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kB on Linux, bytes on macOS
+        result['max_rss_mb'] = maxrss / (1048576. if sys.platform == 'darwin' else 1024.)
+    return result
+
+def metadata():
+    meta = {'python': platform.python_version(), 'platform': platform.platform(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S')}
+    try:
+        meta['commit'] = subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], stderr=subprocess.STDOUT,
+            cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        meta['commit'] = None
+    for name in ('tellurium', 'phrasedml'):
+        try:
+            meta[name] = getattr(__import__(name), '__version__', None)
+        except ImportError:
+            meta[name] = None
+    return meta
+
+def run(args):
+    files = corpus.build(args.corpus, args.sizes)
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for size in args.sizes:
+        archive, sedml = files[size]
+        for action in args.actions:
+            path = archive if action in ('c2p', 'c2pwp') else sedml
+            pool = context.Pool(1)
+            try:
+                result = pool.apply(measure, (size, action, path, args.repeat))
+            finally:
+                pool.close()
+                pool.join()
+            results.append(result)
+            print(formatresult(result))
+    report = {'meta': metadata(), 'results': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=1, sort_keys=True)
+    return 1 if any(result['errors'] for result in results) else 0
+
+def formatresult(result):
+    line = '%-6s %-5s' % (result['size'], result['action'])
+    if 'total' in result:
+        line += ' total %8.3f s  cached %7.4f s  peak %7.1f MB  rss %7.1f MB  tmp %7.1f MB' % (
+            result['total'], result['cached'], result['peak_python_mb'],
+            result.get('max_rss_mb', 0.), result['temp_disk_mb'])
+        line += '\n       ' + '  '.join('%s %.3f' % item for item in sorted(result['stages'].items()))
+    for error in result['errors']:
+        line += '\n       error: ' + error
+    return line
+
+def compare(args):
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    before = dict(((r['size'], r['action']), r) for r in baseline['results'])
+    regressions = 0
+    for result in current['results']:
+        old = before.get((result['size'], result['action']))
+        if old is None or 'total' not in old or 'total' not in result:
+            continue
+        for metric in ('total', 'cached', 'peak_python_mb', 'max_rss_mb', 'temp_disk_mb'):
+            a, b = old.get(metric), result.get(metric)
+            if a is None or b is None:
+                continue
+            change = (b - a) / a if a else 0.
+            flag = ''
+            if change > args.threshold and b - a > args.floor:
+                flag = '  REGRESSION'
+                regressions += 1
+            print('%-6s %-5s %-15s %10.4f -> %10.4f  %+6.1f%%%s' % (
+                result['size'], result['action'], metric, a, b, 100 * change, flag))
+    return 1 if regressions else 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the COMBINE/SED-ML import path")
+    sub = parser.add_subparsers(dest='command')
+    p = sub.add_parser('run', help="measure the import path")
+    p.add_argument('--corpus', default=os.path.join(tempfile.gettempdir(), 'teimport-bench'),
+                   help="directory holding the synthetic corpus (created if missing)")
+    p.add_argument('--sizes', nargs='+', choices=sorted(corpus.SIZES),
+                   default=['small', 'medium', 'large'])
+    p.add_argument('--actions', nargs='+', choices=ACTIONS, default=list(ACTIONS))
+    p.add_argument('--repeat', type=int, default=3)
+    p.add_argument('-o', '--output', help="write the results to this JSON file")
+    p = sub.add_parser('compare', help="compare two result files")
+    p.add_argument('baseline')
+    p.add_argument('current')
+    p.add_argument('--threshold', type=float, default=0.10,
+                   help="relative increase reported as a regression (default 0.10)")
+    p.add_argument('--floor', type=float, default=0.005,
+                   help="ignore absolute increases below this (default 0.005)")
+    args = parser.parse_args(argv)
+    if args.command == 'compare':
+        return compare(args)
+    if args.command is None:
+        args = parser.parse_args(['run'] + list(argv or sys.argv[1:]))
+    return run(args)
+
+if __name__ == '__main__':
+    sys.exit(main())
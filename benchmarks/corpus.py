@@ -0,0 +1,141 @@
+# -*- coding:utf-8 -*-
+
+# Copyright © 2017 Kiri Choi
+# Licensed under the terms of the MIT License
+
+"""Synthetic COMBINE archives and SED-ML files for the import benchmarks"""
+
+from __future__ import print_function, division
+
+import os
+import zipfile
+
+#name: (SBML models, species per model, SED-ML files, MB of data files)
+SIZES = {
+    'small': (1, 10, 1, 0),
+    'medium': (5, 100, 10, 10),
+    'large': (20, 1000, 40, 100),
+    'huge': (50, 5000, 100, 500),
+    }
+
+MANIFEST_NS = "http://identifiers.org/combine.specifications/omex-manifest"
+FORMATS = {
+    'omex': "http://identifiers.org/combine.specifications/omex",
+    'manifest': "http://identifiers.org/combine.specifications/omex-manifest",
+    'sbml': "http://identifiers.org/combine.specifications/sbml",
+    'sedml': "http://identifiers.org/combine.specifications/sed-ml",
+    'data': "http://purl.org/NET/mediatypes/application/octet-stream",
+    }
+
+#Returns an SBML L3V1 model with a chain of mass-action reactions
+def sbmlmodel(modelid, nspecies):
+    species = []
+    reactions = []
+    for i in range(nspecies):
+        species.append('<species id="S%d" compartment="c" initialConcentration="%d" '
+                       'hasOnlySubstanceUnits="false" boundaryCondition="false" '
+                       'constant="false"/>' % (i, 10 if i == 0 else 0))
+    for i in range(nspecies - 1):
+        reactions.append(
+            '<reaction id="J%d" reversible="false" fast="false">'
+            '<listOfReactants><speciesReference species="S%d" stoichiometry="1" constant="true"/></listOfReactants>'
+            '<listOfProducts><speciesReference species="S%d" stoichiometry="1" constant="true"/></listOfProducts>'
+            '<kineticLaw><math xmlns="http://www.w3.org/1998/Math/MathML">'
+            '<apply><times/><ci>k%d</ci><ci>S%d</ci></apply></math>'
+            '<listOfLocalParameters><localParameter id="k%d" value="0.1"/></listOfLocalParameters>'
+            '</kineticLaw></reaction>' % (i, i, i + 1, i, i, i))
+    return ('<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<sbml xmlns="http://www.sbml.org/sbml/level3/version1/core" level="3" version="1">'
+            '<model id="%s">'
+            '<listOfCompartments><compartment id="c" size="1" spatialDimensions="3" constant="true"/></listOfCompartments>'
+            '<listOfSpecies>%s</listOfSpecies>'
+            '<listOfReactions>%s</listOfReactions>'
+            '</model></sbml>\n' % (modelid, ''.join(species), ''.join(reactions)))
+
+#Returns a SED-ML L1V3 time course of one model, plotting its first species
+def sedmldocument(source, nspecies):
+    shown = min(nspecies, 5)
+    generators = ['<dataGenerator id="time" name="time"><listOfVariables>'
+                  '<variable id="t" symbol="urn:sedml:symbol:time" taskReference="task1"/>'
+                  '</listOfVariables><math xmlns="http://www.w3.org/1998/Math/MathML"><ci>t</ci></math>'
+                  '</dataGenerator>']
+    curves = []
+    for i in range(shown):
+        generators.append(
+            '<dataGenerator id="dg%d" name="S%d"><listOfVariables>'
+            '<variable id="v%d" target="/sbml:sbml/sbml:model/sbml:listOfSpecies/sbml:species[@id=\'S%d\']" taskReference="task1"/>'
+            '</listOfVariables><math xmlns="http://www.w3.org/1998/Math/MathML"><ci>v%d</ci></math>'
+            '</dataGenerator>' % (i, i, i, i, i))
+        curves.append('<curve id="c%d" logX="false" logY="false" xDataReference="time" '
+                      'yDataReference="dg%d"/>' % (i, i))
+    return ('<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<sedML xmlns="http://sed-ml.org/sed-ml/level1/version3" '
+            'xmlns:sbml="http://www.sbml.org/sbml/level3/version1/core" level="1" version="3">'
+            '<listOfSimulations><uniformTimeCourse id="sim1" initialTime="0" outputStartTime="0" '
+            'outputEndTime="10" numberOfPoints="100"><algorithm kisaoID="KISAO:0000019"/>'
+            '</uniformTimeCourse></listOfSimulations>'
+            '<listOfModels><model id="model1" language="urn:sedml:language:sbml" source="%s"/></listOfModels>'
+            '<listOfTasks><task id="task1" modelReference="model1" simulationReference="sim1"/></listOfTasks>'
+            '<listOfDataGenerators>%s</listOfDataGenerators>'
+            '<listOfOutputs><plot2D id="plot1"><listOfCurves>%s</listOfCurves></plot2D></listOfOutputs>'
+            '</sedML>\n' % (source, ''.join(generators), ''.join(curves)))
+
+def manifest(entries):
+    content = ['<content location="." format="%s"/>' % FORMATS['omex'],
+               '<content location="./manifest.xml" format="%s"/>' % FORMATS['manifest']]
+    for location, kind in entries:
+        content.append('<content location="./%s" format="%s"/>' % (location, FORMATS[kind]))
+    return ('<?xml version="1.0" encoding="UTF-8"?>\n<omexManifest xmlns="%s">%s</omexManifest>\n'
+            % (MANIFEST_NS, ''.join(content)))
+
+def makearchive(path, nmodels, nspecies, nsedml, datamb):
+    """Write a synthetic COMBINE archive and return its path"""
+    entries = []
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as z:
+        for m in range(nmodels):
+            location = 'models/model%d.xml' % m
+            z.writestr(location, sbmlmodel('model%d' % m, nspecies))
+            entries.append((location, 'sbml'))
+        for s in range(nsedml):
+            location = 'simulations/sim%d.sedml' % s
+            source = '../models/model%d.xml' % (s % nmodels)
+            z.writestr(location, sedmldocument(source, nspecies))
+            entries.append((location, 'sedml'))
+        if datamb:
+            location = 'data/payload.bin'
+            # Random bytes so that compression does not hide the size
+            with z.open(location, 'w', force_zip64=True) as f:
+                for i in range(datamb):
+                    f.write(os.urandom(1024 * 1024))
+            entries.append((location, 'data'))
+        z.writestr('manifest.xml', manifest(entries))
+    return path
+
+def makesedml(directory, name, nspecies):
+    """Write a standalone SED-ML file and its model; return the SED-ML path"""
+    with open(os.path.join(directory, name + '_model.xml'), 'w') as f:
+        f.write(sbmlmodel(name, nspecies))
+    path = os.path.join(directory, name + '.sedml')
+    with open(path, 'w') as f:
+        f.write(sedmldocument(name + '_model.xml', nspecies))
+    return path
+
+def build(directory, sizes=None):
+    """
+    Create the corpus in directory and return {size: (archive, sedml)}.
+    Existing files are reused
+    """
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    corpus = {}
+    for size in sizes or sorted(SIZES):
+        nmodels, nspecies, nsedml, datamb = SIZES[size]
+        archive = os.path.join(directory, size + '.omex')
+        if not os.path.isfile(archive):
+            makearchive(archive + '.part', nmodels, nspecies, nsedml, datamb)
+            os.rename(archive + '.part', archive)
+        sedml = os.path.join(directory, size + '.sedml')
+        if not os.path.isfile(sedml):
+            makesedml(directory, size, nspecies)
+        corpus[size] = (archive, sedml)
+    return corpus
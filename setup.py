@@ -21,6 +21,12 @@ setup(
     packages=['spyder_teimport'],
     keywords=["Qt PyQt4 PyQt5 PySide spyder plugins spyplugins systems-biology"],
     install_requires=REQUIREMENTS,
+    python_requires='>=3.7',
+    entry_points={
+        'console_scripts': [
+            'teimport-convert = spyder_teimport.batch:main',
+            ],
+        },
     url='https://github.com/kirichoi/spyder-teimport',
     license='MIT',
     author='Kiri Choi',
@@ -36,10 +42,9 @@ setup(
         'Intended Audience :: Developers',
         'License :: OSI Approved :: MIT License',
         'Operating System :: OS Independent',
-        'Programming Language :: Python :: 2',
-        'Programming Language :: Python :: 2.7',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.6',
+        'Programming Language :: Python :: 3 :: Only',
+        'Programming Language :: Python :: 3.7',
         'Topic :: Software Development :: Widget Sets'],
     zip_safe=False
     )
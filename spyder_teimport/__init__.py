@@ -5,4 +5,18 @@ __version__ = "1.1.2"
 #==============================================================================
 # The following statement is required to register this 3rd party plugin:
 #==============================================================================
-from .teimport import teImport as PLUGIN_CLASS
+# Imported on first access, so that worker processes, which import this
+# package to unpickle their jobs, do not load Spyder and Qt
+def __getattr__(name):
+    if name != 'PLUGIN_CLASS':
+        raise AttributeError("module %r has no attribute %r" % (__name__, name))
+    from importlib.util import find_spec
+    if find_spec('spyder') is None or find_spec('qtpy') is None:
+        # Spyder or Qt is not installed; the translate and batch modules can
+        # still be used on their own
+        PLUGIN_CLASS = None
+    else:
+        # Other import errors are left for Spyder to report
+        from .teimport import teImport as PLUGIN_CLASS
+    globals()['PLUGIN_CLASS'] = PLUGIN_CLASS
+    return PLUGIN_CLASS
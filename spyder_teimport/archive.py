@@ -0,0 +1,329 @@
+# -*- coding:utf-8 -*-
+
+# Copyright © 2017 Kiri Choi
+# Licensed under the terms of the MIT License
+
+"""COMBINE archive reader"""
+
+from __future__ import print_function, division
+
+import os
+import zlib
+import hashlib
+import posixpath
+import zipfile
+import tempfile, shutil, errno
+from xml.etree import ElementTree
+
+from . import tracing
+
+SBML_FORMAT = "http://identifiers.org/combine.specifications/sbml"
+SEDML_FORMAT = "http://identifiers.org/combine.specifications/sed-ml"
+
+#kind, format identifiers (optionally followed by a version), media types
+FORMATS = (
+    ('SBML', (SBML_FORMAT, "http://purl.org/net/mediatypes/application/sbml+xml"),
+     ('application/sbml+xml',)),
+    ('SED-ML', (SEDML_FORMAT, "http://identifiers.org/combine.specifications/sedml",
+                "http://purl.org/net/mediatypes/application/sedml+xml"),
+     ('application/sedml+xml', 'application/sed-ml+xml')),
+    )
+
+#Members without a usable manifest entry are classified from their first bytes
+SNIFF_CHUNK = 4096
+SNIFF_LIMIT = 65536
+
+#Parsing an XML member takes several times its size in memory; members are
+#only converted when that estimate fits under the memory limit of an archive
+EXPANSION = 10
+
+
+class CombineArchive(object):
+    """
+    Read-only view of a COMBINE archive
+    The zip file is opened once, the manifest is parsed straight from the
+    zip member and SBML/SED-ML members are read in memory. Members are only
+    written to a temporary directory when a downstream API needs a path.
+    memorylimit, in bytes, is the memory the conversion of a member may use.
+    locations optionally gives the (SBML, SED-ML) location lists, already
+    found by another reader of the same archive, to skip their discovery
+    """
+    def __init__(self, combine, memorylimit=None, locations=None):
+        self.filename = str(combine)
+        self.memorylimit = memorylimit
+        self._zip = zipfile.ZipFile(self.filename)
+        self._tempdir = None
+        if locations is not None:
+            self.sbmlloclist, self.sedmlloclist = [list(l) for l in locations]
+            return
+        with tracing.stage('manifestsearch', file=os.path.basename(self.filename)):
+            self.sbmlloclist, self.sedmlloclist = manifestsearch(self._zip)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def entries(self):
+        """
+        Return (location, format, size, compressed size) for the SBML and
+        SED-ML members of the manifest. Sizes come from the zip central
+        directory, so nothing is decompressed; they are None for members
+        missing from the zip
+        """
+        entries = []
+        for kind, loclist in (('SBML', self.sbmlloclist),
+                              ('SED-ML', self.sedmlloclist)):
+            for loc in loclist:
+                try:
+                    info = self._zip.getinfo(membername(loc))
+                except KeyError:
+                    entries.append((loc, kind, None, None))
+                else:
+                    entries.append((loc, kind, info.file_size, info.compress_size))
+        return entries
+
+    def size(self, location):
+        """Return the uncompressed size of a member, or None if it is missing"""
+        try:
+            return self._zip.getinfo(membername(location)).file_size
+        except KeyError:
+            return None
+
+    def oversized(self, locations):
+        """
+        Return the locations whose conversion would not fit under the memory
+        limit, estimated from their uncompressed size
+        """
+        if not self.memorylimit:
+            return []
+        return [loc for loc in locations
+                if (self.size(loc) or 0) * EXPANSION > self.memorylimit]
+
+    def select(self, locations):
+        """Only translate the SED-ML members at the given locations"""
+        names = set(membername(loc) for loc in locations)
+        self.sedmlloclist = [loc for loc in self.sedmlloclist
+                             if membername(loc) in names]
+
+    def read(self, location):
+        """Return the raw bytes of an archive member"""
+        data = self._zip.read(membername(location))
+        tracing.count(bytes_read=len(data))
+        return data
+
+    def readtext(self, location):
+        """Return the content of an archive member as text"""
+        data = self.read(location)
+        try:
+            return data.decode('utf-8')
+        except UnicodeDecodeError:
+            return data.decode('latin-1')
+
+    def digest(self, location):
+        """Return the SHA-256 hex digest of an archive member"""
+        h = hashlib.sha256()
+        with self._zip.open(membername(location)) as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                h.update(chunk)
+                tracing.count(bytes_read=len(chunk))
+        return h.hexdigest()
+
+    def extract(self, location):
+        """Write a single member to the temporary directory and return its path"""
+        if self._tempdir is None:
+            self._tempdir = tempfile.mkdtemp()
+        name = membername(location)
+        path = os.path.join(self._tempdir, *name.split('/'))
+        if not os.path.isfile(path):
+            with tracing.stage('extract', member=name) as span:
+                self._zip.extract(name, self._tempdir)
+                span.add(bytes_written=self._zip.getinfo(name).file_size)
+        return path
+
+    def sedmlpath(self, location):
+        """
+        Return a filesystem path for a SED-ML member, extracting the SBML
+        models it references next to it so that relative sources resolve
+        """
+        for source, sbmlloc in self.sedmlsources(location):
+            try:
+                self.extract(sbmlloc)
+            except KeyError:
+                pass
+        return self.extract(location)
+
+    def sedmlmodels(self, location):
+        """Return the (id, source) of every model declared in a SED-ML member"""
+        models = []
+        try:
+            root = ElementTree.fromstring(self.read(location))
+        except (KeyError, ElementTree.ParseError):
+            return models
+        for element in root.iter():
+            if localname(element.tag) == 'model':
+                models.append((element.get('id'), element.get('source')))
+        return models
+
+    def sedmlsources(self, location):
+        """
+        Return (source, SBML location) pairs for the manifest SBML models a
+        SED-ML member references, following models derived from other models
+        """
+        models = self.sedmlmodels(location)
+        ids = dict(models)
+        sbmlnames = dict((membername(loc), loc) for loc in self.sbmlloclist)
+        basedir = posixpath.dirname(membername(location))
+        sources = []
+        for modelid, source in models:
+            seen = set()
+            while source is not None and source.lstrip('#') in ids \
+                  and source not in seen:
+                seen.add(source)
+                source = ids[source.lstrip('#')]
+            if source is None:
+                continue
+            for name in (membername(posixpath.join(basedir, source)),
+                         membername(source)):
+                if name in sbmlnames:
+                    pair = (source, sbmlnames[name])
+                    if pair not in sources:
+                        sources.append(pair)
+                    break
+        return sources
+
+    def close(self):
+        """Close the zip file and remove extracted members"""
+        self._zip.close()
+        if self._tempdir is not None:
+            delseq(self._tempdir)
+            self._tempdir = None
+
+#Strips the namespace from an XML tag
+def localname(tag):
+    return tag.rsplit('}', 1)[-1]
+
+#Converts a manifest location to the name of the zip member
+def membername(location):
+    name = posixpath.normpath(location.replace('\\', '/'))
+    return name.lstrip('/')
+
+#Returns the (location, format) of every entry of the manifest, or None
+#if the archive has no readable manifest
+def manifestentries(tarzip):
+    try:
+        data = tarzip.read('manifest.xml')
+    except KeyError:
+        return None
+    tracing.count(bytes_read=len(data))
+    try:
+        manifest = ElementTree.fromstring(data)
+    except ElementTree.ParseError:
+        return None
+    return [(child.get('location'), child.get('format')) for child in manifest]
+
+#Returns 'SBML' or 'SED-ML' for a manifest format, including versioned
+#identifiers and media types, or None for other formats
+def formatkind(fmt):
+    if not fmt:
+        return None
+    fmt = fmt.strip().lower().replace('https://', 'http://')
+    for kind, identifiers, mediatypes in FORMATS:
+        for identifier in identifiers:
+            if fmt == identifier or fmt.startswith(identifier + '.'):
+                return kind
+        if fmt in mediatypes:
+            return kind
+    return None
+
+#Returns 'SBML' or 'SED-ML' for the root element of a document, or None
+def rootkind(tag):
+    namespace = tag[1:].split('}', 1)[0].lower() if tag.startswith('{') else ''
+    name = localname(tag)
+    if name == 'sbml' and (not namespace or 'sbml.org/sbml' in namespace):
+        return 'SBML'
+    if name == 'sedML' and (not namespace or 'sed-ml.org' in namespace):
+        return 'SED-ML'
+    return None
+
+def sniff(tarzip, name):
+    """
+    Classify an archive member as 'SBML', 'SED-ML' or None from its root
+    element, decompressing and parsing at most SNIFF_LIMIT bytes of it
+    """
+    try:
+        with tarzip.open(name) as f:
+            return sniffstream(f)
+    except (zipfile.BadZipfile, zlib.error, NotImplementedError, RuntimeError):
+        # A member zipfile cannot decompress
+        return None
+
+#Classifies an XML file on disk the way sniff() classifies archive members
+def snifffile(path):
+    try:
+        with open(path, 'rb') as f:
+            return sniffstream(f)
+    except (IOError, OSError):
+        return None
+
+#Returns the kind of the root element of the document read from the binary
+#file object f, or None if it is not XML or not SBML/SED-ML
+def sniffstream(f):
+    parser = ElementTree.XMLPullParser(events=('start',))
+    read = 0
+    try:
+        while read < SNIFF_LIMIT:
+            chunk = f.read(SNIFF_CHUNK)
+            if not chunk:
+                break
+            read += len(chunk)
+            parser.feed(chunk)
+            for event, element in parser.read_events():
+                return rootkind(element.tag)
+    except ElementTree.ParseError:
+        return None
+    finally:
+        tracing.count(sniffed=1, bytes_sniffed=read)
+    return None
+
+def discover(tarzip):
+    """
+    Return (location, kind) for the SBML and SED-ML members of an archive:
+    first the manifest entries with a known format, then the members the
+    manifest leaves out or gives another format, classified by sniff()
+    """
+    found = []
+    seen = set(['manifest.xml'])
+    for loc, fmt in manifestentries(tarzip) or []:
+        kind = formatkind(fmt)
+        if kind is not None and loc and membername(loc) not in seen:
+            found.append((loc, kind))
+            seen.add(membername(loc))
+    for info in tarzip.infolist():
+        if info.filename.endswith('/') or info.filename in seen:
+            continue
+        kind = sniff(tarzip, info.filename)
+        if kind is not None:
+            found.append((info.filename, kind))
+    return found
+
+#Searches the manifest and the archive content to acquire correct sbml and
+#sedml file location
+def manifestsearch(tarzip):
+    found = discover(tarzip)
+    sbmlloclist = [loc for loc, kind in found if kind == 'SBML']
+    sedmlloclist = [loc for loc, kind in found if kind == 'SED-ML']
+    tracing.count(sbml_entries=len(sbmlloclist), sedml_entries=len(sedmlloclist))
+    return (sbmlloclist, sedmlloclist)
+
+#Garbage collection
+def delseq(floc):
+    try:
+        os.remove(floc)
+    except OSError as E1:
+        try:
+            shutil.rmtree(floc)
+        except OSError as E2:
+            if E1.errno != errno.ENOENT or E2.errno != errno.ENOENT:
+                raise
@@ -0,0 +1,85 @@
+# -*- coding:utf-8 -*-
+
+# Copyright © 2017 Kiri Choi
+# Licensed under the terms of the MIT License
+
+"""Lazy loading of the Tellurium and PhrasedML backends"""
+
+from __future__ import print_function, division
+
+import os, time
+import importlib
+import importlib.util
+import threading
+
+try:
+    from importlib import metadata
+except ImportError:  # Python 3.7
+    metadata = None
+
+from . import tracing
+
+BACKENDS = {
+    'tellurium': "Cannot find Tellurium. Please install Tellurium scripts first",
+    'phrasedml': "Cannot find PhrasedML. Please install PhrasedML package first",
+    }
+
+#Seconds spent importing each backend, for startup measurements
+loadtime = {}
+
+_versions = {}
+
+_lock = threading.Lock()
+
+
+class BackendError(ImportError):
+    """Raised when a translation backend cannot be imported"""
+    pass
+
+#Imports a backend on first use
+def load(name):
+    with _lock:
+        if name in loadtime:
+            return importlib.import_module(name)
+        start = time.time()
+        # Shows up in the timings of the translation that paid for it
+        with tracing.stage('import_backend', backend=name):
+            try:
+                module = importlib.import_module(name)
+            except ImportError as e:
+                raise BackendError(BACKENDS[name] + "\n\n" + str(e))
+        loadtime[name] = time.time() - start
+        return module
+
+def tellurium():
+    """Return the tellurium module, importing it if needed"""
+    return load('tellurium')
+
+def phrasedml():
+    """Return the phrasedml module, importing it if needed"""
+    return load('phrasedml')
+
+#Returns the installed version of a backend without importing it, or ''
+def version(name):
+    if name not in _versions:
+        try:
+            _versions[name] = metadata.version(name)
+        except AttributeError:
+            # No importlib.metadata
+            _versions[name] = getattr(load(name), '__version__', '')
+        except Exception:
+            _versions[name] = ''
+    return _versions[name]
+
+#Returns the error messages of backends that are not installed, without importing them
+def missing():
+    return [message for name, message in sorted(BACKENDS.items())
+            if importlib.util.find_spec(name) is None]
+
+#Imports every backend; used to pre-warm worker processes. Returns the trace
+#of the imports as a dict, with a stage for each backend not loaded before
+def loadall():
+    with tracing.trace('prewarm', pid=os.getpid()) as span:
+        for name in sorted(BACKENDS):
+            load(name)
+    return span.todict()
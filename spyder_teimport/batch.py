@@ -0,0 +1,234 @@
+# -*- coding:utf-8 -*-
+
+# Copyright © 2017 Kiri Choi
+# Licensed under the terms of the MIT License
+
+"""Headless batch conversion of COMBINE archives and SED-ML files"""
+
+from __future__ import print_function, division
+
+import os, sys, time
+import glob
+import argparse
+
+from . import tracing
+from .archive import snifffile
+from .export import exportresults
+from .translate import (ACTIONS, MODELMODES, errormessage, processpool,
+                        pythonfilename, tracedtranslatefile)
+
+EXTENSIONS = {
+    'c2p': ('.omex', '.zip'),
+    'c2pwp': ('.omex', '.zip'),
+    's2p': ('.sedml', '.xml'),
+    's2pwp': ('.sedml', '.xml'),
+    }
+
+
+class BatchSummary(object):
+    """Outcome of a batch conversion"""
+    def __init__(self):
+        self.outputs = {}
+        self.failed = []
+        self.skipped = 0
+        self.peaks = {}
+        self.elapsed = 0.
+
+    @property
+    def total(self):
+        return len(self.outputs) + len(self.failed)
+
+    def report(self):
+        """Return a one-line throughput and failure summary"""
+        scripts = sum(len(paths) for paths in self.outputs.values())
+        rate = self.total / self.elapsed if self.elapsed else 0.
+        report = ("Converted %d of %d files (%d scripts, %d unchanged) in %.2f s, "
+                  "%.2f files/s, %d failed" % (len(self.outputs), self.total,
+                                                scripts, self.skipped, self.elapsed,
+                                                rate, len(self.failed)))
+        if self.peaks:
+            report += ", peak memory %.1f MB" % (max(self.peaks.values()) / 1048576.)
+        return report
+
+#Expands files, directories and glob patterns into the inputs of an action
+#.xml files found in directories are only SED-ML inputs if their root
+#element says so, since SBML models usually sit next to them
+def collectinputs(paths, action):
+    extensions = EXTENSIONS[action]
+    inputs = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    if not name.lower().endswith(extensions):
+                        continue
+                    path = os.path.join(root, name)
+                    if name.lower().endswith('.xml') and action in ('s2p', 's2pwp') \
+                       and snifffile(path) != 'SED-ML':
+                        continue
+                    inputs.append(path)
+        elif os.path.isfile(path):
+            inputs.append(path)
+        else:
+            inputs.extend(name for name in sorted(glob.glob(path, recursive=True))
+                          if os.path.isfile(name))
+    unique = []
+    seen = set()
+    for name in inputs:
+        if os.path.abspath(name) not in seen:
+            seen.add(os.path.abspath(name))
+            unique.append(name)
+    return unique
+
+#Returns the directory the scripts generated from inputfile are written to
+def outputdirectory(inputfile, action, outdir=None):
+    directory = outdir or os.path.dirname(os.path.abspath(inputfile))
+    if action == 'c2p' or action == 'c2pwp':
+        # One archive can produce several scripts; keep them together
+        stem = os.path.splitext(os.path.basename(pythonfilename(inputfile, action)))[0]
+        directory = os.path.join(directory, stem)
+    return directory
+
+#Translates one input for convertfile() and convert(), which runs it in a
+#worker process. Returns the (name, text) results and the highest peak
+#memory of the processes that translated it, member workers included
+def translateinput(inputfile, action, directory, usecache=True, memberworkers=None,
+                   modelmode='inline', memorylimit=None):
+    results, trace = tracedtranslatefile(inputfile, action, usecache,
+                                         memberworkers, modelmode=modelmode,
+                                         modeldir=os.path.join(directory, 'models'),
+                                         memorylimit=memorylimit)
+    peaks = [value for entry in tracing.summarize(trace).values()
+             for key, value in entry.items() if key.startswith('peak_')]
+    return results, max(peaks) if peaks else None
+
+def convertfile(inputfile, action, outdir=None, usecache=True, memberworkers=None,
+                modelmode='inline', memorylimit=None, taken=None):
+    """
+    Translate one input and write the generated scripts, either next to the
+    input or into outdir. Return (written, skipped, peak): lists of paths,
+    where skipped files already held the same script, and the peak memory
+    of the process in bytes, or None. memberworkers translates the members
+    of an archive concurrently; with the sidecar modelmode, model files are
+    written next to the scripts. memorylimit is passed to translatefile().
+    taken holds the names already used in the output directory (see
+    export.exportnames)
+    """
+    directory = outputdirectory(inputfile, action, outdir)
+    results, peak = translateinput(inputfile, action, directory, usecache,
+                                   memberworkers, modelmode, memorylimit)
+    return exportresults(results, directory, taken) + (peak,)
+
+def convert(paths, action, outdir=None, workers=None, usecache=True,
+            progress=None, memberworkers=None, modelmode='inline',
+            memorylimit=None, inprocess=None):
+    """
+    Convert every input found in paths over a process pool and return a
+    BatchSummary. progress, if given, is called as progress(inputfile, error)
+    after each input. Scripts are written in the order of the inputs, and
+    names that clash within an output directory get a numeric suffix.
+    Inputs are translated in this process when workers is 1 or there is a
+    single input, unless inprocess says otherwise
+    """
+    inputs = collectinputs(paths, action)
+    summary = BatchSummary()
+    start = time.time()
+    workers = workers or os.cpu_count() or 1
+    if inprocess is None:
+        inprocess = workers == 1 or len(inputs) <= 1
+    taken = {}
+
+    def write(inputfile, translated):
+        # Names are given here rather than in the workers, so that inputs
+        # writing to the same directory do not overwrite each other
+        results, peak = translated
+        directory = outputdirectory(inputfile, action, outdir)
+        key = os.path.normcase(os.path.abspath(directory))
+        return exportresults(results, directory,
+                             taken.setdefault(key, set())) + (peak,)
+
+    def done(inputfile, outputs=None, error=None):
+        if error is None:
+            written, skipped, peak = outputs
+            summary.outputs[inputfile] = written + skipped
+            summary.skipped += len(skipped)
+            if peak is not None:
+                summary.peaks[inputfile] = peak
+        else:
+            summary.failed.append((inputfile, error))
+        if progress is not None:
+            progress(inputfile, error)
+
+    if inprocess:
+        for inputfile in inputs:
+            try:
+                done(inputfile, write(inputfile, translateinput(
+                    inputfile, action, outputdirectory(inputfile, action, outdir),
+                    usecache, memberworkers, modelmode, memorylimit)))
+            except Exception as e:
+                done(inputfile, error=errormessage(e))
+    else:
+        with processpool(min(workers, len(inputs)) or 1) as executor:
+            futures = [executor.submit(translateinput, inputfile, action,
+                                       outputdirectory(inputfile, action, outdir),
+                                       usecache, memberworkers, modelmode,
+                                       memorylimit)
+                       for inputfile in inputs]
+            # In input order, so that clashing names are given the same
+            # suffixes on every run and unchanged scripts are recognized
+            for index, inputfile in enumerate(inputs):
+                # Futures keep their results; drop each one once written
+                future, futures[index] = futures[index], None
+                try:
+                    done(inputfile, write(inputfile, future.result()))
+                except Exception as e:
+                    done(inputfile, error=errormessage(e))
+    summary.elapsed = time.time() - start
+    return summary
+
+def main(argv=None):
+    """Entry point of the teimport-convert console script"""
+    parser = argparse.ArgumentParser(prog='teimport-convert',
+        description="Convert COMBINE archives or SED-ML files to Python scripts")
+    parser.add_argument('paths', nargs='+',
+                        help="input files, directories or glob patterns")
+    parser.add_argument('-a', '--action', choices=ACTIONS, default='c2p',
+                        help="c2p/c2pwp for COMBINE archives, s2p/s2pwp for "
+                             "SED-ML files; *wp writes PhrasedML (default: c2p)")
+    parser.add_argument('-o', '--output-dir',
+                        help="write scripts here instead of next to the inputs")
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help="number of worker processes (default: CPU count)")
+    parser.add_argument('-J', '--member-jobs', type=int, default=None,
+                        help="worker processes per archive, to translate its "
+                             "SBML models and SED-ML documents concurrently")
+    parser.add_argument('-m', '--models', choices=MODELMODES, default='inline',
+                        help="inline the Antimony models in the scripts, write "
+                             "them to sidecar files, or load the SBML from the "
+                             "archive when the script runs (default: inline)")
+    parser.add_argument('--memory-limit', type=int, default=None, metavar='MB',
+                        help="skip the SED-ML documents whose files are too "
+                             "large to convert within this much memory, "
+                             "per worker process")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="do not use the translation cache")
+    parser.add_argument('-q', '--quiet', action='store_true',
+                        help="only print failures and the summary")
+    args = parser.parse_args(argv)
+
+    def progress(inputfile, error):
+        if error is not None:
+            print("FAILED %s: %s" % (inputfile, error), file=sys.stderr)
+        elif not args.quiet:
+            print("ok %s" % inputfile)
+
+    memorylimit = args.memory_limit * 1048576 if args.memory_limit else None
+    summary = convert(args.paths, args.action, args.output_dir, args.jobs,
+                      not args.no_cache, progress, args.member_jobs, args.models,
+                      memorylimit)
+    print(summary.report())
+    return 1 if summary.failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,116 @@
+# -*- coding:utf-8 -*-
+
+# Copyright © 2017 Kiri Choi
+# Licensed under the terms of the MIT License
+
+"""On-disk cache of translated scripts"""
+
+from __future__ import print_function, division
+
+import os
+import json
+import hashlib
+import tempfile
+
+DEFAULT_MAXSIZE = 256 * 1024 * 1024
+
+
+class TranslationCache(object):
+    """
+    Size-bounded, least-recently-used cache of generated scripts keyed by a
+    content hash of the input. Each entry is a JSON file in the cache
+    directory; its modification time records the last use
+    """
+    def __init__(self, directory=None, maxsize=DEFAULT_MAXSIZE):
+        self.directory = directory or defaultdirectory()
+        self.maxsize = maxsize
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.json')
+
+    def get(self, key):
+        """Return the cached value for key, or None on a miss"""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = json.loads(f.read().decode('utf-8'))
+        except (IOError, OSError, ValueError):
+            return None
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        return value
+
+    def put(self, key, value):
+        """Store a JSON-serializable value under key and evict old entries"""
+        if not os.path.isdir(self.directory):
+            try:
+                os.makedirs(self.directory)
+            except OSError:
+                if not os.path.isdir(self.directory):
+                    raise
+        data = json.dumps(value).encode('utf-8')
+        fd, temppath = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(temppath, self._path(key))
+        self.evict()
+
+    def entries(self):
+        """Return a list of (key, size, last use) tuples, oldest first"""
+        entries = []
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return entries
+        for name in names:
+            if not name.endswith('.json'):
+                continue
+            try:
+                st = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            entries.append((name[:-5], st.st_size, st.st_mtime))
+        entries.sort(key=lambda entry: entry[2])
+        return entries
+
+    def size(self):
+        """Return the total size of the cache in bytes"""
+        return sum(entry[1] for entry in self.entries())
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits maxsize"""
+        entries = self.entries()
+        total = sum(entry[1] for entry in entries)
+        for key, size, mtime in entries:
+            if total <= self.maxsize:
+                break
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+            total -= size
+
+    def clear(self):
+        """Remove every entry from the cache"""
+        for key, size, mtime in self.entries():
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+#Default location of the cache, following the XDG convention
+def defaultdirectory():
+    base = os.environ.get('XDG_CACHE_HOME') or \
+           os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'spyder_teimport')
+
+#Builds a cache key from strings or bytes
+def makekey(*parts):
+    h = hashlib.sha256()
+    for part in parts:
+        if not isinstance(part, bytes):
+            part = str(part).encode('utf-8')
+        h.update(hashlib.sha256(part).digest())
+    return h.hexdigest()
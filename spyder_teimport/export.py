@@ -0,0 +1,58 @@
+# -*- coding:utf-8 -*-
+
+# Copyright © 2017 Kiri Choi
+# Licensed under the terms of the MIT License
+
+"""Writing generated scripts to disk"""
+
+from __future__ import print_function, division
+
+import os
+
+from .translate import writeatomic
+
+
+#Returns collision-free file names for the (name, text) results of a
+#translation, taken from the script names. taken holds names already used
+def exportnames(results, taken=None):
+    taken = set() if taken is None else taken
+    names = []
+    for name, text in results:
+        stem, ext = os.path.splitext(os.path.basename(name))
+        candidate = stem + ext
+        index = 1
+        # Compared case-insensitively, for Windows and macOS file systems
+        while candidate.lower() in taken:
+            index += 1
+            candidate = '%s_%d%s' % (stem, index, ext)
+        taken.add(candidate.lower())
+        names.append(candidate)
+    return names
+
+#Returns True if path already holds exactly text
+def unchanged(path, text):
+    data = text.encode('utf-8')
+    try:
+        if os.path.getsize(path) != len(data):
+            return False
+        with open(path, 'rb') as f:
+            return f.read() == data
+    except OSError:
+        return False
+
+def exportresults(results, directory, taken=None):
+    """
+    Write the (name, text) results of a translation to directory, atomically
+    and under collision-free names. Files that already hold the same text
+    are left alone. Return (written, skipped) lists of paths
+    """
+    written = []
+    skipped = []
+    for filename, (name, text) in zip(exportnames(results, taken), results):
+        path = os.path.join(directory, filename)
+        if unchanged(path, text):
+            skipped.append(path)
+            continue
+        writeatomic(path, text)
+        written.append(path)
+    return written, skipped
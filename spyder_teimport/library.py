@@ -0,0 +1,211 @@
+# -*- coding:utf-8 -*-
+
+# Copyright © 2017 Kiri Choi
+# Licensed under the terms of the MIT License
+
+"""Searchable index of the COMBINE archives in local directories"""
+
+from __future__ import print_function, division
+
+import io
+import os, time
+import sqlite3
+import hashlib
+import zipfile
+import threading
+from xml.etree import ElementTree
+
+from .archive import discover, localname, manifestentries, membername
+from .batch import collectinputs
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS archives (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL,
+    scanned REAL NOT NULL,
+    error TEXT
+);
+CREATE TABLE IF NOT EXISTS members (
+    archive INTEGER NOT NULL REFERENCES archives(id) ON DELETE CASCADE,
+    location TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    size INTEGER,
+    crc INTEGER,
+    sha256 TEXT,
+    modelid TEXT,
+    summary TEXT
+);
+CREATE INDEX IF NOT EXISTS members_archive ON members(archive);
+CREATE INDEX IF NOT EXISTS members_modelid ON members(modelid);
+"""
+
+SIMULATIONS = ('uniformTimeCourse', 'oneStep', 'steadyState', 'analysis')
+TASKS = ('task', 'repeatedTask', 'parameterEstimationTask')
+
+
+class ModelLibrary(object):
+    """
+    SQLite index of the members, SBML model ids and SED-ML simulations of
+    COMBINE archives. Archives are only read again when their modification
+    time or size changed
+    """
+    def __init__(self, path=None):
+        self.path = path or defaultpath()
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        self._lock = threading.Lock()
+        # Scans run in a background thread, searches on the GUI thread
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute('PRAGMA foreign_keys = ON')
+        self._db.executescript(SCHEMA)
+
+    def scan(self, directories, progress=None):
+        """
+        Index the archives found under directories and forget the ones that
+        are gone. progress(path, done, total) is called after each archive.
+        Return (indexed, unchanged, removed) counts
+        """
+        paths = [os.path.abspath(path)
+                 for path in collectinputs(directories, 'c2p')]
+        with self._lock:
+            known = dict((row[0], (row[1], row[2], row[3])) for row in
+                         self._db.execute('SELECT path, id, mtime, size FROM archives'))
+        indexed = unchanged = 0
+        for done, path in enumerate(paths):
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            if path in known and known[path][1:] == (st.st_mtime, st.st_size):
+                unchanged += 1
+            else:
+                self._index(path, st)
+                indexed += 1
+            if progress is not None:
+                progress(path, done + 1, len(paths))
+        roots = [os.path.join(os.path.abspath(directory), '')
+                 for directory in directories]
+        found = set(paths)
+        gone = [(known[path][0],) for path in known if path not in found and
+                any(path.startswith(root) for root in roots)]
+        with self._lock, self._db:
+            self._db.executemany('DELETE FROM archives WHERE id = ?', gone)
+        return indexed, unchanged, len(gone)
+
+    def _index(self, path, st):
+        try:
+            rows = readarchive(path)
+            error = None
+        except Exception as e:
+            rows = []
+            error = '%s: %s' % (type(e).__name__, e)
+        with self._lock, self._db:
+            self._db.execute('DELETE FROM archives WHERE path = ?', (path,))
+            cursor = self._db.execute(
+                'INSERT INTO archives (path, mtime, size, scanned, error) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (path, st.st_mtime, st.st_size, time.time(), error))
+            archive = cursor.lastrowid
+            self._db.executemany(
+                'INSERT INTO members (archive, location, kind, size, crc, '
+                'sha256, modelid, summary) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                [(archive,) + row for row in rows])
+
+    def search(self, query, limit=200):
+        """
+        Return (archive, location, kind, model id, summary) rows of members
+        matching every word of query in their archive path, location,
+        format, model id or SED-ML summary
+        """
+        clauses = []
+        arguments = []
+        for word in query.split():
+            pattern = '%' + word.replace('\\', '\\\\').replace('%', '\\%') \
+                                .replace('_', '\\_') + '%'
+            clauses.append('(' + ' OR '.join(
+                "%s LIKE ? ESCAPE '\\'" % column for column in
+                ('a.path', 'm.location', 'm.kind', 'm.modelid', 'm.summary')) + ')')
+            arguments.extend([pattern] * 5)
+        sql = ('SELECT a.path, m.location, m.kind, m.modelid, m.summary '
+               'FROM members m JOIN archives a ON m.archive = a.id')
+        if clauses:
+            sql += ' WHERE ' + ' AND '.join(clauses)
+        sql += ' ORDER BY a.path, m.location LIMIT ?'
+        arguments.append(limit)
+        with self._lock:
+            return self._db.execute(sql, arguments).fetchall()
+
+    def counts(self):
+        """Return the number of indexed archives and members"""
+        with self._lock:
+            return (self._db.execute('SELECT COUNT(*) FROM archives').fetchone()[0],
+                    self._db.execute('SELECT COUNT(*) FROM members').fetchone()[0])
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+#Default location of the index, following the XDG convention
+def defaultpath():
+    base = os.environ.get('XDG_DATA_HOME') or \
+           os.path.join(os.path.expanduser('~'), '.local', 'share')
+    return os.path.join(base, 'spyder_teimport', 'library.sqlite')
+
+def readarchive(path):
+    """
+    Return (location, kind, size, crc, sha256, model id, summary) rows for
+    the members of an archive. Sizes and CRCs come from the zip central
+    directory; only SBML and SED-ML members are decompressed, other
+    members are described by their manifest format
+    """
+    rows = []
+    with zipfile.ZipFile(path) as z:
+        formats = dict((membername(loc), fmt)
+                       for loc, fmt in manifestentries(z) or [] if loc)
+        kinds = dict((membername(loc), kind) for loc, kind in discover(z))
+        for info in z.infolist():
+            if info.filename.endswith('/'):
+                continue
+            kind = kinds.get(info.filename) or formats.get(info.filename) or ''
+            sha256 = modelid = summary = None
+            if kind == 'SBML' or kind == 'SED-ML':
+                data = z.read(info.filename)
+                sha256 = hashlib.sha256(data).hexdigest()
+                if kind == 'SBML':
+                    modelid, summary = sbmlsummary(data)
+                else:
+                    summary = sedmlsummary(data)
+            rows.append((info.filename, kind, info.file_size, info.CRC,
+                         sha256, modelid, summary))
+    return rows
+
+#Returns the id and name of an SBML model, parsing only up to its model element
+def sbmlsummary(data):
+    try:
+        for event, element in ElementTree.iterparse(io.BytesIO(data), ('start',)):
+            if localname(element.tag) == 'model':
+                return element.get('id'), element.get('name')
+    except ElementTree.ParseError:
+        pass
+    return None, None
+
+#Returns a one-line description of the simulations, tasks and models of a SED-ML
+def sedmlsummary(data):
+    try:
+        root = ElementTree.fromstring(data)
+    except ElementTree.ParseError:
+        return None
+    simulations, tasks, models = [], [], []
+    for element in root.iter():
+        tag = localname(element.tag)
+        if tag in SIMULATIONS:
+            simulations.append('%s %s' % (tag, element.get('id')))
+        elif tag in TASKS:
+            tasks.append(element.get('id') or '')
+        elif tag == 'model':
+            models.append('%s (%s)' % (element.get('id'), element.get('source')))
+    return 'simulations: %s; tasks: %s; models: %s' % (
+        ', '.join(simulations), ', '.join(tasks), ', '.join(models))
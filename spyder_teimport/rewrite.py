@@ -0,0 +1,100 @@
+# -*- coding:utf-8 -*-
+
+# Copyright © 2017 Kiri Choi
+# Licensed under the terms of the MIT License
+
+"""Single-pass line rewriting of generated scripts"""
+
+from __future__ import print_function, division
+
+import os
+import re
+
+LOADSBML = re.compile(r"loadSBMLModel\((.*)\)")
+SAVEFIG = re.compile(r"savefig\((.*)\)")
+
+
+class LineRewriter(object):
+    """
+    Pipeline of rewrite rules applied to a script in one pass
+    A rule is a callable taking a line and returning None to keep it
+    unchanged, or a list of lines to emit instead (empty to drop it).
+    Lines emitted by a rule are passed on to the following rules
+    """
+    def __init__(self, rules=()):
+        self.rules = list(rules)
+
+    def add(self, rule):
+        """Append a rule to the pipeline"""
+        self.rules.append(rule)
+        return self
+
+    def rewrite(self, text):
+        """Return text with every rule applied to each of its lines"""
+        output = []
+        for line in text.splitlines():
+            lines = [line]
+            for rule in self.rules:
+                rewritten = []
+                for s in lines:
+                    result = rule(s)
+                    if result is None:
+                        rewritten.append(s)
+                    else:
+                        rewritten.extend(result)
+                lines = rewritten
+                if not lines:
+                    break
+            output.extend(lines)
+        return '\n'.join(output)
+
+#Drops the lines saving figures to disk
+def dropsavefig(line):
+    if SAVEFIG.search(line):
+        return []
+
+
+class InlineModels(object):
+    """
+    Replace loadSBMLModel(path) calls with the loading of a model variable
+    defined in the script right before its first use
+    define(variable, sbmlloc) returns the lines defining the variable and
+    the tellurium function loading it, e.g. loada for an Antimony string
+    """
+    def __init__(self, sources, define):
+        self.sources = sources
+        self.define = define
+        self.loaders = {}
+
+    def __call__(self, line):
+        m = LOADSBML.search(line)
+        if m is None or not self.sources:
+            return None
+        k = matchsource(m.group(1), self.sources)
+        variable = modelvariable(k)
+        lines = []
+        if variable not in self.loaders:
+            definition, self.loaders[variable] = self.define(variable,
+                                                             self.sources[k][1])
+            lines.append(definition)
+        line = line.replace("loadSBMLModel", self.loaders[variable]).replace(m.group(1), variable)
+        return lines + [line]
+
+#Returns a define function for InlineModels embedding Antimony strings
+def inlineantimony(antimony):
+    def define(variable, sbmlloc):
+        return variable + " = '''\n" + antimony(sbmlloc) + "'''\n", 'loada'
+    return define
+
+#Name of the variable holding the index-th model of a generated script
+def modelvariable(index):
+    if index == 0:
+        return "AntimonyModel"
+    return "AntimonyModel%d" % (index + 1)
+
+#Returns the index of the model source a loadSBMLModel argument refers to
+def matchsource(argument, sources):
+    for k, (source, sbmlloc) in enumerate(sources):
+        if source is not None and os.path.basename(source) in argument:
+            return k
+    return 0
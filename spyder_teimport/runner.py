@@ -0,0 +1,100 @@
+# -*- coding:utf-8 -*-
+
+# Copyright © 2017 Kiri Choi
+# Licensed under the terms of the MIT License
+
+"""Execution of generated scripts in worker processes"""
+
+from __future__ import print_function, division
+
+import os, io, re
+import contextlib
+import traceback
+
+from . import tracing
+from .translate import tracedtranslatefile
+
+
+#Runs in each new worker process, before tellurium imports matplotlib
+def runnerinit():
+    os.environ['MPLBACKEND'] = 'Agg'
+
+def runscript(name, text, directory):
+    """
+    Execute a generated script and copy the NumPy arrays left in its
+    namespace to memory-mapped .npy files in directory, so that another
+    process can map them instead of receiving them pickled.
+    Return (variables, output, error): variables is a list of
+    (name, path, shape, dtype, colnames), output what the script printed
+    and error its traceback, or None
+    """
+    import numpy
+    namespace = {'__name__': '__main__'}
+    output = io.StringIO()
+    error = None
+    with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+        try:
+            exec(compile(text, name, 'exec'), namespace)
+        except BaseException:
+            error = traceback.format_exc()
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    variables = []
+    for key, value in sorted(namespace.items()):
+        if key.startswith('_') or not isinstance(value, numpy.ndarray) \
+           or value.dtype.hasobject:
+            continue
+        path = os.path.join(directory, key + '.npy')
+        array = numpy.lib.format.open_memmap(path, mode='w+', dtype=value.dtype,
+                                             shape=value.shape)
+        array[...] = value
+        array.flush()
+        del array
+        tracing.count(arrays=1, bytes_written=value.nbytes)
+        # roadrunner results are NamedArrays; keep their column names
+        colnames = [str(c) for c in getattr(value, 'colnames', None) or []]
+        variables.append((key, path, value.shape, value.dtype.str, colnames))
+    return variables, output.getvalue(), error
+
+def runfile(inputfile, action, directory, usecache=True, modelmode='inline',
+            memorylimit=None):
+    """
+    Translate a COMBINE archive or SED-ML file and run each generated script
+    with runscript(). Return (results, trace, runs) where runs holds
+    (name, variables, output, error) for every script
+    """
+    results, trace = tracedtranslatefile(inputfile, action, usecache,
+                                         modelmode=modelmode,
+                                         memorylimit=memorylimit)
+    runs = []
+    for name, text in results:
+        stem = identifier(os.path.splitext(os.path.basename(name))[0])
+        with tracing.trace('run', script=os.path.basename(name)) as span:
+            runs.append((name,) + runscript(name, text, os.path.join(directory, stem)))
+        trace['children'].append(span.todict())
+    return results, trace, runs
+
+#Turns a file name into a valid Python identifier
+def identifier(name):
+    name = re.sub(r'\W', '_', name)
+    if not name or name[0].isdigit():
+        name = '_' + name
+    return name
+
+def loadcode(name, variables, output=''):
+    """
+    Return the code defining, in a console, the variables of a script run
+    by runscript(). Arrays are mapped copy-on-write from their .npy files and
+    named after the script, e.g. sim1_result
+    """
+    prefix = identifier(os.path.splitext(os.path.basename(name))[0])
+    lines = ['import numpy as _teimport_np']
+    for key, path, shape, dtype, colnames in variables:
+        variable = prefix + '_' + key
+        lines.append('%s = _teimport_np.load(%r, mmap_mode="c")' % (variable, path))
+        if colnames:
+            lines.append('%s_colnames = %r' % (variable, colnames))
+    if output:
+        lines.append('%s_output = %r' % (prefix, output))
+    lines.append('del _teimport_np')
+    return '\n'.join(lines)
@@ -9,32 +9,32 @@
 
 from __future__ import print_function, division
 
-import os, time
-import re, functools
-import zipfile
-import tempfile, shutil, errno
-from xml.etree import ElementTree
+import os
+import functools
 from spyder.config.base import get_translation
 from spyder.config.utils import (get_filter, get_edit_filters, 
                                  get_edit_filetypes)
 from spyder.api.plugins import SpyderPluginWidget
 from spyder.widgets.dock import SpyderDockWidget
 from spyder.py3compat import getcwd, is_text_string, to_text_string
-from qtpy.QtWidgets import QApplication, QMessageBox, QMenu, QAction
-from qtpy.compat import getopenfilenames, from_qvariant
+from qtpy.QtCore import QTimer
+from qtpy.QtGui import QTextCursor
+from qtpy.QtWidgets import (QApplication, QMessageBox, QMenu, QAction,
+                            QTabWidget, QVBoxLayout)
+from qtpy.compat import getexistingdirectory, getopenfilenames, from_qvariant
 from spyder.utils import encoding, sourcecode
 from spyder.utils.qthelpers import create_action, add_actions
 from spyder.plugins.editor.widgets.codeeditor import CodeEditor
 
-try:
-    import tellurium as te
-except ImportError:
-    raise Exception("Cannot find Tellurium. Please install Tellurium scripts first")
-
-try:
-    import phrasedml as pl
-except ImportError:
-    raise Exception("Cannot find PhrasedML. Please install PhrasedML package first")
+from . import tracing
+from .backends import missing
+from .batch import EXTENSIONS
+from .library import ModelLibrary
+from .runner import loadcode
+from .translate import MODELMODES, getcache, pythonfilename, translatefile
+from .widgets import LibraryPanel, PreviewDialog, ScriptsPanel, TracePanel
+from .worker import (ArchivePreviewer, ExperimentRunner, ImportWatcher,
+                     LibraryScanner, ScriptExporter, TranslationWorker)
 
 _ = get_translation("teImport", dirname="spyder_teimport")
 
@@ -45,8 +45,55 @@ class teImport(SpyderPluginWidget):
     
     def __init__(self, main):
         super(teImport, self).__init__(main)
+        self.scripts_panel = ScriptsPanel(self)
+        self.scripts_panel.sig_open_script.connect(self._open_script)
+        self.trace_panel = TracePanel(self)
+        self.library_panel = LibraryPanel(self)
+        self.library_panel.sig_import.connect(self.import_Files)
+        self.library_panel.sig_add_directory.connect(self.add_Library_directory)
+        self.library_panel.sig_rescan.connect(self.scan_Library)
+        self.tabwidget = QTabWidget(self)
+        self.tabwidget.addTab(self.scripts_panel, _("Generated scripts"))
+        self.tabwidget.addTab(self.trace_panel, _("Import timings"))
+        self.tabwidget.addTab(self.library_panel, _("Model library"))
+        layout = QVBoxLayout()
+        layout.addWidget(self.tabwidget)
+        self.setLayout(layout)
         self.dockwidget = SpyderDockWidget(self.get_plugin_title(), main)
+        self.dockwidget.setWidget(self)
         self.dockwidget.hide()
+        self.worker = TranslationWorker(self,
+                                        workers=self.get_option('workers', None))
+        self.worker.sig_translated.connect(self._on_translated)
+        self.worker.sig_failed.connect(self._on_failed)
+        self.worker.sig_progress.connect(self._on_progress)
+        self.worker.sig_finished.connect(self._on_finished)
+        self.worker.sig_prewarmed.connect(self._record)
+        self.watcher = ImportWatcher(self,
+                                     interval=self.get_option('watch_interval', 2000))
+        self.watcher.sig_updated.connect(self._on_updated)
+        self.watcher.sig_failed.connect(self._on_watch_failed)
+        self.runner = ExperimentRunner(self,
+                                       workers=self.get_option('workers', None))
+        self.runner.sig_ran.connect(self._on_ran)
+        self.runner.sig_failed.connect(self._on_failed)
+        self.exporter = ScriptExporter(self,
+                                       workers=self.get_option('workers', None))
+        self.exporter.sig_progress.connect(self._on_export_progress)
+        self.exporter.sig_finished.connect(self._on_exported)
+        self.exporter.sig_failed.connect(functools.partial(self._on_failed, ''))
+        self.previewer = ArchivePreviewer(self)
+        self.previewer.sig_previewed.connect(self._on_previewed)
+        self.scanner = LibraryScanner(self)
+        self.scanner.sig_progress.connect(self._on_scan_progress)
+        self.scanner.sig_finished.connect(self._on_scan_finished)
+        self.scanner.sig_failed.connect(self.library_panel.set_status)
+        self.library = None
+        self._pending = {}
+        self._batch = None
+        # (input file, script name): editor, since archives can generate
+        # scripts with the same name
+        self._editors = {}
         
     #------ SpyderPluginWidget API --------------------------------------------
     def get_plugin_title(self):
@@ -67,6 +114,27 @@ class teImport(SpyderPluginWidget):
         s2pwp_act = create_action(self.main, _("Import SED-ML as PhrasedML"),
                                    triggered=self.run_Import)
         s2pwp_act.triggered.connect(functools.partial(self.run_Import, 's2pwp'))
+        run_act = create_action(self.main, _("Import and run COMBINE/SED-ML..."),
+                                triggered=self.run_Experiment)
+        export_act = create_action(self.main, _("Export COMBINE/SED-ML as Python scripts..."),
+                                   triggered=self.export_Scripts)
+        exportwp_act = create_action(self.main, _("Export COMBINE/SED-ML as PhrasedML scripts..."),
+                                     triggered=functools.partial(self.export_Scripts,
+                                                                 True))
+        self.cancel_act = create_action(self.main, _("Cancel COMBINE/SED-ML import"),
+                                        triggered=self.cancel_Import)
+        self.cancel_act.setEnabled(False)
+        cache_act = create_action(self.main, _("COMBINE/SED-ML translation cache..."),
+                                  triggered=self.show_Cache)
+        timings_act = create_action(self.main, _("COMBINE/SED-ML import timings"),
+                                    triggered=functools.partial(self.show_Panel,
+                                                                self.trace_panel))
+        library_act = create_action(self.main, _("COMBINE model library"),
+                                    triggered=self.show_Library)
+        self.watch_act = create_action(self.main,
+                                       _("Watch imported files for changes"),
+                                       toggled=self.toggle_Watch)
+        self.watch_act.setChecked(self.get_option('watch', False))
 
         for item in self.main.file_menu_actions:
             try:
@@ -77,12 +145,21 @@ class teImport(SpyderPluginWidget):
                 if not is_text_string(menu_title): # string is a QString
                     menu_title = to_text_string(menu_title.toUtf8)
                 if item.title() == str("Import"):
-                    item.addAction(c2p_act, c2pwp_act, s2p_act, s2pwp_act)
-        all_actions = (None, c2p_act, c2pwp_act, s2p_act, s2pwp_act)
+                    item.addAction(c2p_act, c2pwp_act, s2p_act, s2pwp_act, run_act)
+        all_actions = (None, c2p_act, c2pwp_act, s2p_act, s2pwp_act, run_act,
+                       export_act, exportwp_act,
+                       None, self.cancel_act, cache_act, timings_act,
+                       library_act, self.watch_act)
         import_menu = QMenu(_("Import"))
         add_actions(import_menu, all_actions)
         self.main.file_menu_actions.insert(6, import_menu)
 
+        # Tellurium and PhrasedML are only imported when first needed; the
+        # worker processes can optionally load them once Spyder is idle
+        if self.get_option('prewarm', False) and not missing():
+            QTimer.singleShot(self.get_option('prewarm_delay', 10000),
+                              self.worker.prewarm)
+
     def on_first_registration(self):
         """Action to be performed on first plugin registration"""
         self.main.tabify_plugins(self.main.help, self)
@@ -90,6 +167,14 @@ class teImport(SpyderPluginWidget):
         
     def closing_plugin(self, cancelable=False):
         """Perform actions before parent main window is closed"""
+        self.worker.shutdown()
+        self.runner.shutdown()
+        self.exporter.shutdown()
+        self.watcher.shutdown()
+        self.scanner.shutdown()
+        self.previewer.shutdown()
+        if self.library is not None:
+            self.library.close()
         return True
             
     def apply_plugin_settings(self, options):
@@ -101,7 +186,6 @@ class teImport(SpyderPluginWidget):
         """Prompt user to load a COMBINE archive or SED-ML file and translates it"""
         if action == 'c2p' or action == 'c2pwp' or action == 's2p' or action == 's2pwp':
             editorwindow = None #Used in editor.load
-            processevents = True  #Used in editor.load
             goto = None
             word = ''
             
@@ -176,94 +260,473 @@ class teImport(SpyderPluginWidget):
             elif goto is not None and len(goto) != len(filenames):
                 goto = None
             
+            jobs = []
             for index, filename in enumerate(filenames):
-                if action == 'c2p' or action == 'c2pwp':
-                    p = re.compile( '(.zip$|.omex$)')
-                    pythonfile = p.sub( '.py', filename)
-                    if (pythonfile == filename):
-                        pythonfile = filename + ".py"
-                else:
-                    p = re.compile( '(.xml$|.sedml$)')
-                    if action == 's2p':
-                        pythonfile = p.sub( '_sedml.py', filename)
-                        if (pythonfile == filename):
-                            pythonfile = filename + "_sedml.py"
-                    else:
-                        pythonfile = p.sub( '_phrasedml.py', filename)
-                        if (pythonfile == filename):
-                            pythonfile = filename + "_phrasedml.py"
+                pythonfile = pythonfilename(filename, action)
                 current_editor = editor.set_current_filename(pythonfile, editorwindow)
                 if current_editor is None:
                     # -- Not a valid filename:
                     if not os.path.isfile(filename):
                         continue
                     # --
-                    current_es = editor.get_current_editorstack(editorwindow)
-    
-                    # Creating the editor widget in the first editorstack (the one
-                    # that can't be destroyed), then cloning this editor widget in
-                    # all other editorstacks:
-                    finfo, newname = self.load_and_translate(filename, pythonfile, editor, action)
-                    finfo.path = editor.main.get_spyder_pythonpath()
-                    editor._clone_file_everywhere(finfo)
-                    current_editor = current_es.set_current_filename(newname)
-                    
-                    current_es.analyze_script()
+                    jobs.append((filename, pythonfile))
+                    continue
                 if goto is not None: # 'word' is assumed to be None as well
                     current_editor.go_to_line(goto[index], word=word)
                     position = current_editor.get_position('cursor')
                     editor.cursor_moved(filename0, position0, filename, position)
-                if (current_editor is not None):
-                    current_editor.clearFocus()
-                    current_editor.setFocus()
-                    current_editor.window().raise_()
-                if processevents:
-                    QApplication.processEvents()
-
-    def load_and_translate(self, inputfile, pythonfile, editor, action, set_current=True):
+                current_editor.clearFocus()
+                current_editor.setFocus()
+                current_editor.window().raise_()
+            
+            if jobs and not missing() and (action == 'c2p' or action == 'c2pwp') \
+               and self.get_option('preview_archives', True):
+                # The archives are read off the GUI thread; the import goes
+                # on in _on_previewed
+                self.main.statusBar().showMessage(_("Reading %d archive(s)...")
+                                                  % len(jobs))
+                self.previewer.preview(jobs, (action, editorwindow))
+                return
+            self._start_Import(jobs, action, {}, editorwindow)
+
+    def _on_previewed(self, previews, context):
+        action, editorwindow = context
+        self.main.statusBar().clearMessage()
+        jobs, members = self.preview_Archives(previews)
+        self._start_Import(jobs, action, members, editorwindow)
+
+    def run_Experiment(self):
+        """
+        Prompt user for COMBINE archives or SED-ML files, translate and run
+        them in worker processes and load their results in the console
+        """
+        filenames = self._get_input_filenames(_("Import and run"))
+        if not filenames:
+            return
+        if missing():
+            QMessageBox.critical(self, self.get_plugin_title(),
+                                 "<br>".join(missing()))
+            return
+        jobs = []
+        for filename in filenames:
+            if filename.lower().endswith(EXTENSIONS['c2p']):
+                jobs.append((filename, 'c2p'))
+            else:
+                jobs.append((filename, 's2p'))
+        self.runner.start(jobs, usecache=self.get_option('use_cache', True),
+                          modelmode=self._model_mode(),
+                          memorylimit=self._memory_limit(self.runner.workers))
+        self.main.statusBar().showMessage(_("Running %d experiment(s)...")
+                                          % len(jobs), 5000)
+
+    def export_Scripts(self, phrasedml=False):
+        """
+        Prompt user for COMBINE archives or SED-ML files and a directory, and
+        write the generated Python scripts there without opening editors.
+        With phrasedml, the scripts hold PhrasedML instead of SED-ML
+        """
+        editor = self.main.editor
+        if phrasedml:
+            caption = _("Export as PhrasedML scripts")
+        else:
+            caption = _("Export as Python scripts")
+        filenames = self._get_input_filenames(caption)
+        if not filenames:
+            return
+        if missing():
+            QMessageBox.critical(self, self.get_plugin_title(),
+                                 "<br>".join(missing()))
+            return
+        editor.redirect_stdio.emit(False)
+        outdir = getexistingdirectory(editor.get_current_editorstack(),
+                                      _("Export scripts to"),
+                                      os.path.dirname(filenames[0]))
+        editor.redirect_stdio.emit(True)
+        if not outdir:
+            return
+        groups = {}
+        for filename in filenames:
+            action = 'c2p' if filename.lower().endswith(EXTENSIONS['c2p']) else 's2p'
+            if phrasedml:
+                action += 'wp'
+            groups.setdefault(action, []).append(filename)
+        self.exporter.export(groups, outdir,
+                             usecache=self.get_option('use_cache', True),
+                             modelmode=self._model_mode(),
+                             memorylimit=self._memory_limit(self.exporter.workers))
+
+    def _get_input_filenames(self, caption):
+        """Ask for COMBINE archives or SED-ML files; return absolute paths"""
+        editor = self.main.editor
+        basedir = getcwd()
+        c_fname = editor.get_current_filename()
+        if c_fname is not None and c_fname != editor.TEMPFILE_PATH:
+            basedir = os.path.dirname(c_fname)
+        filters = ('COMBINE archives and SED-ML files (*.omex *.zip *.sedml *.xml);;'
+                   'All files (*.*)')
+        editor.redirect_stdio.emit(False)
+        filenames, _selfilter = getopenfilenames(editor.get_current_editorstack(),
+                                                 caption, basedir, filters)
+        editor.redirect_stdio.emit(True)
+        return [os.path.abspath(os.path.normpath(filename))
+                for filename in filenames or []]
+
+    def _on_export_progress(self, filename, done, total):
+        self.main.statusBar().showMessage(_("Exported %s (%d/%d)...")
+                                          % (os.path.basename(filename), done, total))
+
+    def _on_exported(self, summaries):
+        """Report the outcome of an export"""
+        self.main.statusBar().clearMessage()
+        lines = [summary.report() for summary in summaries]
+        for summary in summaries:
+            for filename, message in summary.failed:
+                lines.append("<b>%s</b>: %s" % (os.path.basename(filename), message))
+        QMessageBox.information(self, self.get_plugin_title(), "<br>".join(lines))
+
+    def _on_ran(self, filename, action, results, trace, runs):
+        """Load the results of an experiment in the current console"""
+        self.scripts_panel.add_scripts(filename, pythonfilename(filename, action),
+                                       results)
+        self._record(trace)
+        ipyconsole = getattr(self.main, 'ipyconsole', None)
+        shellwidget = ipyconsole.get_current_shellwidget() if ipyconsole else None
+        arrays = 0
+        errors = []
+        for name, variables, output, error in runs:
+            if error is not None:
+                errors.append("<b>%s</b>:<br>%s" % (os.path.basename(name),
+                                                    error.strip().splitlines()[-1]))
+            if shellwidget is not None:
+                shellwidget.silent_execute(loadcode(name, variables, output))
+                arrays += len(variables)
+        if shellwidget is None:
+            errors.append(_("No console is open to receive the results"))
+        self.main.statusBar().showMessage(
+            _("Ran %s: %d arrays loaded in the console")
+            % (os.path.basename(filename), arrays), 10000)
+        if errors:
+            QMessageBox.warning(self, self.get_plugin_title(), "<br>".join(errors))
+
+    def import_Files(self, members, action):
+        """
+        Translate archives without asking for them, e.g. from the model
+        library. members maps each archive to the SED-ML locations to
+        import, or None for all of them
+        """
+        jobs = [(filename, pythonfilename(filename, action))
+                for filename in members if os.path.isfile(filename)]
+        self._start_Import(jobs, action,
+                           dict((filename, locations) for filename, locations
+                                in members.items() if locations is not None))
+
+    def _start_Import(self, jobs, action, members=None, editorwindow=None):
+        if jobs and missing():
+            QMessageBox.critical(self, self.get_plugin_title(),
+                                 "<br>".join(missing()))
+            return
+        if jobs:
+            # Translations run in worker processes; editors are created
+            # in _on_translated as each result arrives. Jobs started while
+            # a batch is running join it
+            for filename, pythonfile in jobs:
+                self._pending[filename] = {'action': action,
+                                           'editorwindow': editorwindow,
+                                           'members': (members or {}).get(filename)}
+            if self.worker.is_running():
+                self._batch.add(files=len(jobs))
+            else:
+                self._batch = tracing.Span('run_Import', action=action,
+                                           files=len(jobs))
+                self.cancel_act.setEnabled(True)
+                widgeteditor = self.main.editor.editorstacks[0]
+                widgeteditor.starting_long_process.emit(
+                    _("Translating %s (0/%d)...")
+                    % (os.path.basename(jobs[0][0]), len(jobs)))
+            self.worker.start(jobs, action,
+                              usecache=self.get_option('use_cache', True),
+                              members=members, modelmode=self._model_mode(),
+                              memorylimit=self._memory_limit(self.worker.workers),
+                              memberworkers=self.get_option('member_workers', 0))
+
+    def preview_Archives(self, previews):
+        """
+        Let the user pick the SED-ML documents to import from each archive
+        that has several. previews come from ArchivePreviewer. Return the
+        remaining jobs and a dict mapping archives to the selected locations
+        """
+        selected_jobs = []
+        members = {}
+        for filename, pythonfile, entries, count in previews:
+            # Unreadable archives are left to the worker to report
+            if count < 2:
+                selected_jobs.append((filename, pythonfile))
+                continue
+            dialog = PreviewDialog(filename, entries, self)
+            if not dialog.exec_():
+                continue
+            selected = dialog.selected()
+            if len(selected) < count:
+                members[filename] = selected
+            selected_jobs.append((filename, pythonfile))
+        return selected_jobs, members
+
+    def cancel_Import(self):
+        """Cancel the translations that are still running"""
+        self.worker.cancel()
+
+    def show_Panel(self, panel=None):
+        """Show the plugin's dock widget, optionally on one of its panels"""
+        if panel is not None:
+            self.tabwidget.setCurrentWidget(panel)
+        self.dockwidget.show()
+        self.dockwidget.raise_()
+
+    def toggle_Watch(self, checked):
+        """Turn watching of imported files on or off"""
+        self.set_option('watch', checked)
+        if not checked:
+            self.watcher.unwatch_all()
+
+    def show_Library(self):
+        """Show the model library and bring its index up to date"""
+        self.show_Panel(self.library_panel)
+        self.scan_Library()
+        self.library_panel.search_edit.setFocus()
+
+    def _getlibrary(self):
+        if self.library is None:
+            self.library = ModelLibrary(self.get_option('library_path', None))
+            self.library_panel.library = self.library
+        return self.library
+
+    def add_Library_directory(self, directory):
+        """Add a directory of archives to the model library"""
+        directories = self.get_option('library_directories', [])
+        directory = os.path.abspath(directory)
+        if directory not in directories:
+            self.set_option('library_directories', directories + [directory])
+        self.scan_Library()
+
+    def scan_Library(self):
+        """Index new and modified archives of the library directories"""
+        library = self._getlibrary()
+        directories = [directory for directory in
+                       self.get_option('library_directories', [])
+                       if os.path.isdir(directory)]
+        self.library_panel.search()
+        if not directories:
+            self.library_panel.set_status(_("Add a directory of COMBINE archives "
+                                            "to build the library"))
+            return
+        self.scanner.scan(library, directories)
+
+    def _on_scan_progress(self, filename, done, total):
+        self.library_panel.set_status(_("Indexing %s (%d/%d)...")
+                                      % (os.path.basename(filename), done, total))
+
+    def _on_scan_finished(self, counts):
+        indexed, unchanged, removed = counts
+        archives, members = self.library.counts()
+        self.library_panel.set_status(
+            _("%d archives, %d members (%d indexed, %d removed)")
+            % (archives, members, indexed, removed))
+        self.library_panel.search()
+
+    def show_Cache(self):
+        """Show the size of the translation cache and offer to clear it"""
+        cache = getcache()
+        entries = cache.entries()
+        size = sum(entry[1] for entry in entries)
+        answer = QMessageBox.question(self, self.get_plugin_title(),
+                    _("The translation cache in <b>%s</b> holds %d scripts "
+                      "(%.1f MB of %.1f MB).<br><br>Clear it?")
+                    % (cache.directory, len(entries), size / 1048576.,
+                       cache.maxsize / 1048576.),
+                    QMessageBox.Yes | QMessageBox.No)
+        if answer == QMessageBox.Yes:
+            cache.clear()
+
+    def _on_translated(self, filename, pythonfile, results, trace):
+        """Create the editors of a translated file on the GUI thread"""
+        with tracing.trace('editors', memory=False) as span:
+            if self._is_lazy(results):
+                # Only list the scripts; editors are built when opened
+                self.scripts_panel.add_scripts(filename, pythonfile, results)
+                self.show_Panel(self.scripts_panel)
+                span.add(placeholders=len(results))
+            else:
+                self._create_editors(filename, pythonfile, results)
+        trace['children'].append(span.todict())
+        if self._batch is not None:
+            self._batch.children.append(trace)
+        if self.get_option('watch', False):
+            pending = self._pending.get(filename, {})
+            self.watcher.watch(filename, pending.get('action'),
+                               pending.get('members'), self._model_mode())
+
+    def _on_updated(self, filename, results):
+        """Refresh the scripts of a watched file that changed on disk"""
+        editorstack = self.main.editor.editorstacks[0]
+        for name, text in results:
+            self.scripts_panel.update_script(filename, name, text)
+            index = self._find_editor(filename, name)
+            if index is None:
+                # Never opened, or closed by the user; leave it closed
+                continue
+            # Replacing the document in one edit block keeps it undoable
+            # and updates every clone of the editor
+            codeeditor = editorstack.data[index].editor
+            cursor = codeeditor.textCursor()
+            cursor.beginEditBlock()
+            cursor.select(QTextCursor.Document)
+            cursor.insertText(text + os.linesep)
+            cursor.endEditBlock()
+        self.main.statusBar().showMessage(
+            _("Updated %d script(s) from %s") % (len(results),
+                                                 os.path.basename(filename)),
+            5000)
+
+    def _on_watch_failed(self, filename, message):
+        """Report a watched file that could not be translated again"""
+        self.main.statusBar().showMessage(
+            _("Failed to update %s: %s") % (os.path.basename(filename),
+                                             message.splitlines()[-1]),
+            10000)
+
+    def _find_editor(self, filename, name):
+        """
+        Return the index in the first editorstack of the editor of a script
+        translated from filename, or None if it is not open
+        """
+        codeeditor = self._editors.get((filename, name))
+        if codeeditor is not None:
+            for index, finfo in enumerate(self.main.editor.editorstacks[0].data):
+                if finfo.editor is codeeditor:
+                    return index
+            del self._editors[(filename, name)]
+        return None
+
+    def _model_mode(self):
+        """Return how generated scripts get their models (see MODELMODES)"""
+        modelmode = self.get_option('model_mode', 'inline')
+        return modelmode if modelmode in MODELMODES else 'inline'
+
+    def _memory_limit(self, workers=1):
+        """
+        Return the memory_limit option in bytes, or None if it is unset.
+        The limit is shared by the given number of worker processes, so
+        each of them gets its part
+        """
+        limit = self.get_option('memory_limit', 0)
+        return limit * 1048576 // workers if limit else None
+
+    def _is_lazy(self, results):
+        """Return True if results should be listed instead of opened"""
+        if self.get_option('lazy_editors', False):
+            return True
+        threshold = self.get_option('lazy_threshold', 0)
+        return bool(threshold) and len(results) > threshold
+
+    def _open_script(self, filename, pythonfile, name, text):
+        """Create the editor of a script listed in the scripts panel"""
+        index = self._find_editor(filename, name)
+        if index is not None:
+            # Already materialized; another archive may have a script with
+            # the same name, so the editor is not looked up by name
+            self.main.editor.editorstacks[0].set_stack_index(index)
+            return
+        self._create_editors(filename, pythonfile, [(name, text)])
+
+    def _create_editors(self, filename, pythonfile, results):
+        editor = self.main.editor
+        pending = self._pending.get(filename, {})
+        current_es = editor.get_current_editorstack(pending.get('editorwindow'))
+        # Creating the editor widget in the first editorstack (the one
+        # that can't be destroyed), then cloning this editor widget in
+        # all other editorstacks:
+        finfo, newname = self.load_and_translate(filename, pythonfile, editor,
+                                                 pending.get('action'),
+                                                 results=results)
+        finfo.path = editor.main.get_spyder_pythonpath()
+        editor._clone_file_everywhere(finfo)
+        current_editor = current_es.set_current_filename(newname)
+        current_es.analyze_script()
+        if (current_editor is not None):
+            current_editor.clearFocus()
+            current_editor.setFocus()
+            current_editor.window().raise_()
+
+    def _on_failed(self, filename, message):
+        """Report a file that could not be translated"""
+        if self._batch is not None:
+            self._batch.children.append(
+                tracing.Span('translate', file=os.path.basename(filename),
+                             error=message).todict())
+        QMessageBox.critical(self, self.get_plugin_title(),
+                             _("Failed to translate <b>%s</b>:<br><br>%s")
+                             % (os.path.basename(filename), message))
+
+    def _on_progress(self, filename, done, total):
+        """Show per-file progress in the status bar"""
+        # The wait cursor is set once per batch, in _start_Import
+        if done < total:
+            self.main.statusBar().showMessage(
+                _("Translated %s (%d/%d)...") % (os.path.basename(filename),
+                                                 done, total))
+
+    def _on_finished(self):
+        """Clear the progress indicator once the batch is done or cancelled"""
+        self.cancel_act.setEnabled(False)
+        widgeteditor = self.main.editor.editorstacks[0]
+        widgeteditor.ending_long_process.emit("")
+        if self._batch is not None:
+            self._record(self._batch.stop().todict())
+            self._batch = None
+
+    def _record(self, trace):
+        """Show a finished import in the timings panel and optionally dump it"""
+        self.trace_panel.add_trace(trace)
+        trace_file = self.get_option('trace_file', '')
+        if trace_file:
+            try:
+                tracing.dump(trace, trace_file)
+            except (IOError, OSError) as e:
+                tracing.logger.warning("Cannot write %s: %s", trace_file, e)
+
+    def load_and_translate(self, inputfile, pythonfile, editor, action, set_current=True,
+                           results=None):
         """
         If the input is COMBINE archive, read filename as combine archive, 
         unzip, translate, reconstitute in Python or PhrasedML, and create an 
         editor instance and return it
         If the input is SED-ML file, read filename as SED-ML file, translate 
         it to Python, and create an editor instance and return it
+        If results is given, the translation has already been done by the
+        worker and only the editors are created
         *Warning* This is loading file, creating editor but not executing
         the source code analysis -- the analysis must be done by the editor
         plugin (in case multiple editorstack instances are handled)
         """
         inputfile = str(inputfile)
-        text, enc = encoding.read(inputfile)
-        if action == 'c2p':
-            fformat = '.py'
-            text = Translatecombine2P(inputfile)
-            zipextloctemp, sbmlloclisttemp, sedmlloclisttemp = manifestsearch(inputfile)
-        elif action == 'c2pwp':
-            fformat = '_phrasedml.py'
-            text = Translatecombine2WP(inputfile)
-            zipextloctemp, sbmlloclisttemp, sedmlloclisttemp = manifestsearch(inputfile)
-        elif action == 's2p':
-            fname = os.path.basename(inputfile)
-            temp =  '"End of code generated by Import SED-ML plugin ' + time.strftime("%m/%d/%Y") + '"\n"Extracted from ' + fname + '"\n\n'
-            text = te.sedmlToPython(inputfile) + temp
-        else:
-            fname = os.path.basename(inputfile)
-            temp =  '"End of code generated by Import SED-ML with PhrasedML plugin ' + time.strftime('%m/%d/%Y') + '"\n"Extracted from ' + fname + '"'
-            text = "import tellurium as te\n\nphrasedmlStr = '''" + pl.convertFile(inputfile) + "'''\n\nte.executeSEDML(te.sedml.tephrasedml.phrasedml.convertString(phrasedmlStr))\n\n" + temp
-        if action == 'c2p' or action == 'c2pwp':
-            for i in range(len(text)):
+        # Generated scripts are text built in memory, not decoded from the
+        # input, which may be a binary archive
+        enc = 'utf-8'
+        if results is None:
+            results = translatefile(inputfile, action,
+                                    memorylimit=self._memory_limit())
+        for name, text in results:
+            with tracing.stage('create_editor', name=os.path.basename(name)):
                 widgeteditor = editor.editorstacks[0]
                 widgeteditor.starting_long_process.emit(_("Loading %s...") % inputfile)
-                sedmlfname = os.path.basename(sedmlloclisttemp[i])
-                finfo = widgeteditor.create_new_editor(os.path.splitext(sedmlfname)[0] + fformat, enc, text[i], set_current, new=True)
+                finfo = widgeteditor.create_new_editor(name, enc, text, set_current, new=True)
+                self._editors[(inputfile, name)] = finfo.editor
                 index = widgeteditor.data.index(finfo)
                 widgeteditor._refresh_outlineexplorer(index, update=True)
                 widgeteditor.ending_long_process.emit("")
                 if widgeteditor.isVisible() and widgeteditor.checkeolchars_enabled \
-                 and sourcecode.has_mixed_eol_chars(text[i]):
-                    if action == 'c2p':
-                        name = os.path.basename(os.path.splitext(sedmlfname)[0] + fformat)
-                    else:
-                        name = os.path.basename(pythonfile[:-3] + fformat)
+                 and sourcecode.has_mixed_eol_chars(text):
+                    name = os.path.basename(name)
                     QMessageBox.warning(self, widgeteditor.title,
                                         _("<b>%s</b> contains mixed end-of-line "
                                           "characters.<br>Spyder will fix this "
@@ -273,165 +736,4 @@ class teImport(SpyderPluginWidget):
                 widgeteditor.is_analysis_done = False
                 finfo.editor.set_cursor_position('eof')
                 finfo.editor.insert_text(os.linesep)
-        else:
-            widgeteditor = editor.editorstacks[0]
-            widgeteditor.starting_long_process.emit(_("Loading %s...") % inputfile)
-            finfo = widgeteditor.create_new_editor(pythonfile, enc, text, set_current, new=True)
-            index = widgeteditor.data.index(finfo)
-            widgeteditor._refresh_outlineexplorer(index, update=True)
-            widgeteditor.ending_long_process.emit("")
-            if widgeteditor.isVisible() and widgeteditor.checkeolchars_enabled \
-              and sourcecode.has_mixed_eol_chars(text):
-                name = os.path.basename(pythonfile)
-                QMessageBox.warning(self, widgeteditor.title,
-                                    _("<b>%s</b> contains mixed end-of-line "
-                                      "characters.<br>Spyder will fix this "
-                                      "automatically.") % name,
-                                      QMessageBox.Ok)
-                widgeteditor.set_os_eol_chars(index)
-            widgeteditor.is_analysis_done = False
-            finfo.editor.set_cursor_position('eof')
-            finfo.editor.insert_text(os.linesep)
         return finfo, inputfile
-
-#Extracts combine archive to a temporary directory
-def zipext(combine):
-    tarzip = zipfile.ZipFile(combine)
-    extloc = tempfile.mkdtemp()
-    tarzip.extractall(extloc)
-    tarzip.close()
-    return extloc
-    
-#Searches the manifest to acquire correct sbml and sedml file location
-def manifestsearch(combine):
-    __manifest = True
-    sbmlloclist = []
-    sedmlloclist = []
-    zipextloc = zipext(combine)
-    manifestloc = os.path.join(zipextloc, 'manifest.xml')
-    try:
-        manifest = ElementTree.parse(manifestloc)
-    except IOError:
-        __manifest = False
-    if __manifest == True:
-        root = manifest.getroot()
-        for child in root:
-            attribute = child.attrib
-            formtype = attribute.get('format')
-            loc = attribute.get('location')
-            if formtype == "http://identifiers.org/combine.specifications/sbml":
-                sbmlloc = loc
-                sbmlloclist.append(sbmlloc)
-            elif formtype == "http://identifiers.org/combine.specifications/sed-ml":
-                sedmlloc = loc
-                sedmlloclist.append(sedmlloc)
-        return (zipextloc, sbmlloclist, sedmlloclist)
-    else:
-        print ("Manifest file not found. teImport plugin will search for the model file...")
-
-
-#Garbage collection
-def delseq(floc):
-    try:
-        os.remove(floc)
-    except OSError as E1:
-        try:
-            shutil.rmtree(floc)
-        except OSError as E2:
-            if E1.errno != errno.ENOENT or E2.errno != errno.ENOENT:
-                raise
-
-#Customized from Ipythonify
-def Translatecombine2P(combine):
-    
-    #Creates a string with both SBML and SEDML included
-    def translate(combine, filename):
-        sbmlstrlist = []
-        sedmlstrlist = []
-        outputstrlist = []
-        rePath = r"loadSBMLModel\((.*)\)"
-        reFig = r"savefig\((.*)\)"
-        outputstr = '"End of code generated by Import Combine plugin ' + time.strftime("%m/%d/%Y") + '"\n"Extracted from ' + filename + '"\n'
-        zipextloc, sbmlloclist, sedmlloclist = manifestsearch(combine)
-            
-        for i in range(len(sbmlloclist)):
-            sbml = te.readFromFile(os.path.join(zipextloc,sbmlloclist[i]))
-            try:
-                transtext = te.sbmlToAntimony(sbml)
-            except Exception as e:
-                transtext = """*********************WARNING*********************
-Failed to translate the SBML model to Antimony string.
-Please check that the SBML file is valid.
-*********************WARNING*********************"""
-                transtext = transtext + "\n\n" + str(e)
-            sbmlstrlist.append(transtext)
-        for j in range(len(sedmlloclist)):
-            sedmlstr = te.sedmlToPython(os.path.join(zipextloc,sedmlloclist[j]))
-            lines = sedmlstr.splitlines()
-            for i,s in enumerate(lines):
-                reSearchPath = re.split(rePath, s)
-                if len(reSearchPath) > 1:
-                    s = s.replace("loadSBMLModel", "loada")
-                    s = s.replace(reSearchPath[1],"AntimonyModel")
-                    lines[i] = s
-                    lines.insert(i - 1, "AntimonyModel = '''\n" + sbmlstrlist[0] + "'''\n")
-            for i,s in enumerate(lines):
-                reSearchFig = re.split(reFig, s)
-                if len(reSearchFig) > 1:
-                    del lines[i]
-            
-            sedmlstr = '\n'.join(lines)
-            
-            sedmlstrlist.append(sedmlstr)
-
-        for k in range(len(sedmlstrlist)):
-            outputstrlist.append(sedmlstrlist[k] + '\n\n' + outputstr)
-        
-        delseq(zipextloc)
-        return outputstrlist
-                
-    fname = os.path.basename(combine)
-    return translate(combine, fname)
-
-def Translatecombine2WP(combine):
-
-    def getbasename(path):
-        e = re.compile(r'.*[/\\]([^/\\]*\.[^/\\]*)')
-        m = e.match(path)
-        if m is None:
-            raise RuntimeError('Path not recognized: {}'.format(path))
-        return m.groups()[0]
-						
-    #Creates a string with both SBML and SEDML included
-    def translate(combine, filename):
-        sbmlstrlist = []
-        sedmlstrlist = []
-        outputstrlist = []
-        outputstr = '"End of code generated by Import Combine as PhrasedML plugin ' + time.strftime("%m/%d/%Y") + '"\n"Extracted from ' + filename + '"\n'
-        zipextloc, sbmlloclist, sedmlloclist = manifestsearch(combine)
-        for i in range(len(sbmlloclist)):
-            sbml = te.readFromFile(os.path.join(zipextloc,sbmlloclist[i]))
-            try:
-                transtext = te.sbmlToAntimony(sbml)
-            except Exception as e:
-                transtext = """*********************WARNING*********************
-Failed to translate the SBML model to Antimony string.
-Please check that the SBML file is valid.
-*********************WARNING*********************"""
-                transtext = transtext + "\n\n" + str(e)
-            sbmlstrlist.append(transtext)
-        for j in range(len(sedmlloclist)):
-            sedmlstr = pl.convertFile(os.path.join(zipextloc,sedmlloclist[j]))
-            sedmlstr = sedmlstr.replace('"compartment"', '"compartment_"')
-            sedmlstr = sedmlstr.replace("'compartment'", "'compartment_'")
-            sedmlstrlist.append(sedmlstr)
-        
-        for k in range(len(sedmlstrlist)):
-            outputstrlist.append("AntimonyModel = '''\n" + sbmlstrlist[0] + "'''\n\nPhrasedMLstr = '''\n" + sedmlstrlist[k] + 
-            "'''\n\nimport tellurium as te\n\nexp = te.experiment([AntimonyModel], [PhrasedMLstr])\nexp.execute(PhrasedMLstr)\n\n" + outputstr)
-        
-        delseq(zipextloc)
-        return outputstrlist
-                
-    fname = os.path.basename(combine)
-    return translate(combine, fname)
@@ -0,0 +1,155 @@
+# -*- coding:utf-8 -*-
+
+# Copyright © 2017 Kiri Choi
+# Licensed under the terms of the MIT License
+
+"""Per-stage timing of the import pipeline"""
+
+from __future__ import print_function, division
+
+import sys, time
+import json
+import logging
+import threading
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+
+class Span(object):
+    """
+    Timed stage of an import, with counters (bytes read, models and SED-ML
+    files processed, ...) and nested sub-stages
+    """
+    def __init__(self, name, **attrs):
+        self.name = name
+        self.attrs = attrs
+        self.children = []
+        self.started = time.time()
+        self.duration = None
+        self._start = time.perf_counter()
+
+    def stop(self):
+        """Record the duration of the span"""
+        self.duration = time.perf_counter() - self._start
+        return self
+
+    def add(self, **counts):
+        """Increment counters of the span"""
+        for key, value in counts.items():
+            self.attrs[key] = self.attrs.get(key, 0) + value
+
+    def todict(self):
+        """Return the span as a JSON-serializable dict"""
+        return {'name': self.name, 'started': self.started,
+                'duration': self.duration, 'attrs': dict(self.attrs),
+                'children': [child if isinstance(child, dict) else child.todict()
+                             for child in self.children]}
+
+
+class _NullSpan(object):
+    """Stand-in returned by stage() when no trace is active"""
+    def add(self, **counts):
+        pass
+
+NULLSPAN = _NullSpan()
+
+@contextmanager
+def trace(name, memory=True, **attrs):
+    """
+    Start collecting stages for the current thread under a root span, and
+    record the peak memory of the process while it is active. Pass
+    memory=False where the process does more than the traced work, e.g.
+    in Spyder itself
+    """
+    previous = getattr(_local, 'stack', None)
+    span = Span(name, **attrs)
+    _local.stack = [span]
+    if memory:
+        resetpeak()
+    try:
+        yield span
+    finally:
+        span.stop()
+        peak = peakmemory() if memory else None
+        if peak is not None:
+            span.attrs['peak_memory'] = peak
+        _local.stack = previous
+        logger.debug(json.dumps(span.todict()))
+
+@contextmanager
+def stage(name, **attrs):
+    """Time a stage of the active trace; does nothing if there is none"""
+    stack = getattr(_local, 'stack', None)
+    if not stack:
+        yield NULLSPAN
+        return
+    span = Span(name, **attrs)
+    stack[-1].children.append(span)
+    stack.append(span)
+    logger.debug("start %s %s", name, attrs)
+    try:
+        yield span
+    finally:
+        span.stop()
+        stack.pop()
+        logger.debug("end %s %.3fs %s", name, span.duration, span.attrs)
+
+#Adds counters to the innermost active stage
+def count(**counts):
+    stack = getattr(_local, 'stack', None)
+    if stack:
+        stack[-1].add(**counts)
+
+#Sums durations and counters by stage name over a span dict and its children
+def summarize(span, totals=None):
+    if totals is None:
+        totals = {}
+    entry = totals.setdefault(span['name'], {'calls': 0, 'duration': 0.})
+    entry['calls'] += 1
+    entry['duration'] += span['duration'] or 0.
+    for key, value in span['attrs'].items():
+        if key.startswith('peak_'):
+            entry[key] = max(entry.get(key, 0), value or 0)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            entry[key] = entry.get(key, 0) + value
+    for child in span['children']:
+        summarize(child, totals)
+    return totals
+
+#Resets the peak memory of the process where the kernel allows it (Linux),
+#so that peakmemory() only covers what follows
+def resetpeak():
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except (IOError, OSError):
+        pass
+
+#Returns the peak resident memory of the process in bytes, or None. Unlike
+#tracemalloc, this includes the memory of libsbml and other native code
+def peakmemory():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except (IOError, OSError, ValueError):
+        pass
+    if resource is None:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kB on Linux, bytes on macOS
+    return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+#Appends a span dict to a JSON lines file
+def dump(span, path):
+    with open(path, 'a') as f:
+        f.write(json.dumps(span, sort_keys=True) + '\n')
@@ -0,0 +1,632 @@
+# -*- coding:utf-8 -*-
+
+# Copyright © 2017 Kiri Choi
+# Licensed under the terms of the MIT License
+
+"""Translation of COMBINE archives and SED-ML files to Python scripts"""
+
+from __future__ import print_function, division
+
+import os, time
+import re
+import tempfile
+import posixpath
+import logging
+import traceback
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from xml.etree import ElementTree
+
+from . import tracing
+from .archive import EXPANSION, CombineArchive, localname, membername
+from .backends import tellurium, phrasedml, version
+from .cache import TranslationCache, makekey
+from .rewrite import (LineRewriter, InlineModels, dropsavefig, inlineantimony,
+                      modelvariable)
+
+ACTIONS = ('c2p', 'c2pwp', 's2p', 's2pwp')
+
+#How the scripts generated from an archive get their models: Antimony text
+#inlined in the script, Antimony sidecar files, or SBML read from the archive
+MODELMODES = ('inline', 'sidecar', 'archive')
+
+#Bumped whenever the generated scripts change, to invalidate cached ones
+FORMAT = 4
+
+logger = logging.getLogger(__name__)
+
+_cache = None
+
+#Returns a process pool whose workers are spawned, not forked: forking a
+#process running Qt or other threads can deadlock the child
+def processpool(workers=None, initializer=None):
+    return ProcessPoolExecutor(max_workers=workers, initializer=initializer,
+                               mp_context=multiprocessing.get_context('spawn'))
+
+#Returns the shared translation cache
+def getcache():
+    global _cache
+    if _cache is None:
+        _cache = TranslationCache()
+    return _cache
+
+#Builds the cache key of a translation from the input content
+def cachekey(action, *parts):
+    return makekey(action, FORMAT, version('tellurium'), version('phrasedml'),
+                   *parts)
+
+#Returns the name of the generated script for an input file
+def pythonfilename(filename, action):
+    if action == 'c2p' or action == 'c2pwp':
+        p = re.compile( '(.zip$|.omex$)')
+        pythonfile = p.sub( '.py', filename)
+        if (pythonfile == filename):
+            pythonfile = filename + ".py"
+    else:
+        p = re.compile( '(.xml$|.sedml$)')
+        if action == 's2p':
+            pythonfile = p.sub( '_sedml.py', filename)
+            if (pythonfile == filename):
+                pythonfile = filename + "_sedml.py"
+        else:
+            pythonfile = p.sub( '_phrasedml.py', filename)
+            if (pythonfile == filename):
+                pythonfile = filename + "_phrasedml.py"
+    return pythonfile
+
+#Returns the name of the script generated from a SED-ML member of an archive
+def scriptname(sedmlloc, action):
+    fformat = '.py' if action == 'c2p' else '_phrasedml.py'
+    return os.path.splitext(os.path.basename(sedmlloc))[0] + fformat
+
+#Returns the directory sidecar model files of an archive are written to
+def modeldirectory(filename):
+    stem = os.path.splitext(os.path.abspath(filename))[0]
+    return stem + '_models'
+
+def translatefile(inputfile, action, usecache=True, workers=None, members=None,
+                  modelmode='inline', modeldir=None, memorylimit=None):
+    """
+    Translate a COMBINE archive or SED-ML file according to the import action
+    and return a list of (name, text) tuples, one per generated script.
+    This does not touch Qt, so it can run in a worker thread or process.
+    With workers > 1, the members of an archive are translated concurrently
+    and documents that fail are replaced by a script describing the error.
+    members optionally restricts an archive to some SED-ML locations.
+    modelmode is one of MODELMODES; sidecar files go to modeldir, by
+    default a folder next to the archive. SED-ML documents whose files are
+    too large to convert under memorylimit bytes are replaced by a script
+    saying so; with a memorylimit, members are translated one at a time
+    """
+    inputfile = str(inputfile)
+    if memorylimit:
+        # The limit holds for one conversion at a time, not for a pool
+        workers = None
+    if action == 'c2p' or action == 'c2pwp':
+        if action == 'c2p':
+            translator = Translatecombine2P
+        else:
+            translator = Translatecombine2WP
+        if modelmode == 'sidecar' and modeldir is None:
+            modeldir = modeldirectory(inputfile)
+        with CombineArchive(inputfile, memorylimit) as archive:
+            if members is not None:
+                archive.select(members)
+            sedmlloclist = archive.sedmlloclist
+            if not workers or workers < 2 or len(sedmlloclist) < 2:
+                text = translator(inputfile, archive, usecache, modelmode, modeldir)
+        if workers and workers > 1 and len(sedmlloclist) > 1:
+            text, errors = Translatecombineparallel(inputfile, action, workers,
+                                                    usecache, members,
+                                                    modelmode, modeldir,
+                                                    memorylimit)
+            text = [failedscript(sedmlloc, dict(errors).get(sedmlloc, ''))
+                    if t is None else t for sedmlloc, t in zip(sedmlloclist, text)]
+        names = [scriptname(sedmlloc, action) for sedmlloc in sedmlloclist]
+        return list(zip(names, text))
+    elif action == 's2p':
+        return [(pythonfilename(inputfile, action),
+                 Translatesedml2P(inputfile, usecache))]
+    elif action == 's2pwp':
+        return [(pythonfilename(inputfile, action),
+                 Translatesedml2WP(inputfile, usecache))]
+    raise ValueError('Unknown import action: {}'.format(action))
+
+def tracedtranslatefile(inputfile, action, usecache=True, workers=None,
+                        members=None, modelmode='inline', modeldir=None,
+                        memorylimit=None):
+    """
+    Same as translatefile(), but also return the timing trace of the
+    translation, with its peak memory, as a dict (see tracing.Span.todict)
+    """
+    with tracing.trace('translate', file=os.path.basename(str(inputfile)),
+                       action=action) as span:
+        results = translatefile(inputfile, action, usecache, workers, members,
+                                modelmode, modeldir, memorylimit)
+    return results, span.todict()
+
+#Returns the cached value for key, or None on a miss or if the cache
+#cannot be read
+def cacheget(key):
+    with tracing.stage('cache') as span:
+        try:
+            value = getcache().get(key)
+        except (IOError, OSError) as e:
+            logger.warning("Cannot read the translation cache: %s", e)
+            value = None
+        span.add(hits=int(value is not None))
+    return value
+
+#Stores value under key; a cache that cannot be written is only logged,
+#since the translation itself succeeded
+def cacheput(key, value):
+    with tracing.stage('cache_store'):
+        try:
+            getcache().put(key, value)
+        except (IOError, OSError) as e:
+            logger.warning("Cannot write the translation cache: %s", e)
+
+#Runs translate(), unless the cache already holds its result for key
+def cached(key, translate, *args):
+    text = cacheget(key)
+    if text is None:
+        text = translate(*args)
+        cacheput(key, text)
+    return text
+
+#Builds the cache key of a SED-ML file from its content, its directory
+#(generated scripts set it as their working directory) and the content of
+#the model files it references
+def sedmlkey(action, sedml):
+    with tracing.stage('hash'):
+        with open(sedml, 'rb') as f:
+            data = f.read()
+        tracing.count(bytes_read=len(data))
+        directory = os.path.dirname(os.path.abspath(sedml))
+        parts = [os.path.basename(sedml), data, directory]
+        for path in sedmlmodelfiles(data, directory):
+            with open(path, 'rb') as f:
+                model = f.read()
+            tracing.count(bytes_read=len(model))
+            parts += [path, model]
+        return cachekey(action, *parts)
+
+#Returns the existing model files referenced by the SED-ML document data,
+#whose relative sources are resolved against directory
+def sedmlmodelfiles(data, directory):
+    try:
+        root = ElementTree.fromstring(data)
+    except ElementTree.ParseError:
+        return []
+    paths = []
+    for element in root.iter():
+        source = element.get('source')
+        if localname(element.tag) != 'model' or not source or source.startswith('#'):
+            continue
+        path = os.path.join(directory, source)
+        if os.path.isfile(path) and path not in paths:
+            paths.append(path)
+    return paths
+
+#Builds the cache key of an archive from the content of the SED-ML members to
+#translate and of the models they use, leaving other members compressed
+def combinekey(action, combine, archive, modelmode='inline', modeldir=None):
+    with tracing.stage('hash'):
+        parts = [os.path.basename(combine)] + archive.sbmlloclist
+        if modelmode != 'inline':
+            # Scripts refer to the archive or the sidecar files by path
+            parts += [modelmode, os.path.abspath(combine), modeldir]
+        models = ModelSet(archive, None, modelmode, modeldir)
+        sbmlloclist = []
+        for loc in archive.sedmlloclist:
+            parts.append(loc)
+            parts.append(archive.digest(loc))
+            sources = models.sources(loc)
+            # Members skipped under the memory limit give different scripts
+            oversized = models.oversized(loc, sources)
+            if oversized:
+                parts.append(oversized)
+            for source, sbmlloc in sources:
+                if sbmlloc not in sbmlloclist:
+                    sbmlloclist.append(sbmlloc)
+        for loc in sbmlloclist:
+            parts.append(loc)
+            parts.append(archive.digest(loc))
+        return cachekey(action, *parts)
+
+def Translatesedml2P(sedml, usecache=True):
+
+    def translate(sedml):
+        te = tellurium()
+        fname = os.path.basename(sedml)
+        temp =  '"End of code generated by Import SED-ML plugin ' + time.strftime("%m/%d/%Y") + '"\n"Extracted from ' + fname + '"\n\n'
+        with tracing.stage('sedmlToPython', member=fname) as span:
+            span.add(sedml=1)
+            text = te.sedmlToPython(sedml)
+        return text + temp
+
+    if not usecache:
+        return translate(sedml)
+    return cached(sedmlkey('s2p', sedml), translate, sedml)
+
+def Translatesedml2WP(sedml, usecache=True):
+
+    def translate(sedml):
+        pl = phrasedml()
+        fname = os.path.basename(sedml)
+        temp =  '"End of code generated by Import SED-ML with PhrasedML plugin ' + time.strftime('%m/%d/%Y') + '"\n"Extracted from ' + fname + '"'
+        with tracing.stage('convertFile', member=fname) as span:
+            span.add(sedml=1)
+            text = pl.convertFile(sedml)
+        return "import tellurium as te\n\nphrasedmlStr = '''" + text + "'''\n\nte.executeSEDML(te.sedml.tephrasedml.phrasedml.convertString(phrasedmlStr))\n\n" + temp
+
+    if not usecache:
+        return translate(sedml)
+    return cached(sedmlkey('s2pwp', sedml), translate, sedml)
+
+class ModelSet(object):
+    """
+    SBML models of an archive, converted to Antimony once each and only
+    when a SED-ML document references them. modelmode (see MODELMODES)
+    decides how the generated scripts define them
+    """
+    def __init__(self, archive, memo=None, modelmode='inline', modeldir=None):
+        self.archive = archive
+        self._antimony = {} if memo is None else memo
+        self.modelmode = modelmode
+        self.modeldir = modeldir
+        self._digests = {}
+        self._users = {}
+
+    def sources(self, sedmlloc):
+        """Return the (source, SBML location) pairs a SED-ML member uses"""
+        sources = self.archive.sedmlsources(sedmlloc)
+        if not sources and self.archive.sbmlloclist:
+            # References that cannot be resolved fall back to the first model
+            sources = [(None, self.archive.sbmlloclist[0])]
+        return sources
+
+    def antimony(self, sbmlloc):
+        """Return the Antimony translation of an SBML member"""
+        if sbmlloc not in self._antimony:
+            with tracing.stage('sbmlToAntimony', member=sbmlloc) as span:
+                span.add(models=1)
+                self._antimony[sbmlloc] = sbmltoantimony(self.archive.readtext(sbmlloc))
+        return self._antimony[sbmlloc]
+
+    def retain(self, sourcelist):
+        """Count the SED-ML members, given by their sources, using each model"""
+        for sources in sourcelist:
+            for source, sbmlloc in sources:
+                self._users[sbmlloc] = self._users.get(sbmlloc, 0) + 1
+
+    def release(self, sources):
+        """
+        Forget the Antimony text of the models of a translated SED-ML member
+        that no remaining member uses
+        """
+        for source, sbmlloc in sources:
+            self._users[sbmlloc] = self._users.get(sbmlloc, 0) - 1
+            if self._users[sbmlloc] <= 0:
+                self._antimony.pop(sbmlloc, None)
+
+    def oversized(self, sedmlloc, sources):
+        """
+        Return the files of a SED-ML member too large to convert under the
+        memory limit of the archive. Models loaded from the archive by the
+        script are not converted, so only the SED-ML counts for them
+        """
+        locations = [sedmlloc]
+        if self.modelmode != 'archive':
+            locations += [sbmlloc for source, sbmlloc in sources]
+        return self.archive.oversized(locations)
+
+    def needsantimony(self, sbmlloc):
+        """Return True if defining an SBML member requires its Antimony text"""
+        if self.modelmode == 'archive':
+            return False
+        if self.modelmode == 'sidecar':
+            return not os.path.isfile(self.sidecarpath(sbmlloc))
+        return True
+
+    def sidecarpath(self, sbmlloc):
+        """Return the path of the sidecar file of an SBML member"""
+        if sbmlloc not in self._digests:
+            self._digests[sbmlloc] = self.archive.digest(sbmlloc)
+        stem = os.path.splitext(posixpath.basename(membername(sbmlloc)))[0]
+        # Named after the content so that a changed model never reuses the
+        # file of its previous version
+        return os.path.join(self.modeldir, '%s_%s.ant'
+                            % (stem, self._digests[sbmlloc][:12]))
+
+    def sidecar(self, sbmlloc):
+        """Write the Antimony text of an SBML member once and return its path"""
+        path = self.sidecarpath(sbmlloc)
+        if not os.path.isfile(path):
+            with tracing.stage('write_sidecar', member=sbmlloc):
+                writeatomic(path, self.antimony(sbmlloc))
+        return os.path.abspath(path)
+
+    def definer(self, action):
+        """
+        Return the define(variable, sbmlloc) function used by assemble(),
+        which returns the lines defining variable as the model and the
+        tellurium function that loads it
+        """
+        if self.modelmode == 'sidecar':
+            def define(variable, sbmlloc):
+                return ("with open(%r, encoding='utf-8') as sidecar:\n    %s = sidecar.read()\n"
+                        % (self.sidecar(sbmlloc), variable), 'loada')
+        elif self.modelmode == 'archive':
+            combine = os.path.abspath(self.archive.filename)
+            def define(variable, sbmlloc):
+                text = ("import zipfile\nwith zipfile.ZipFile(%r) as omex:\n"
+                        "    %s = omex.read(%r).decode('utf-8')\n"
+                        % (combine, variable, membername(sbmlloc)))
+                if action == 'c2p':
+                    return text, 'loadSBMLModel'
+                return (text + "import tellurium as te\n%s = te.sbmlToAntimony(%s)\n"
+                        % (variable, variable), 'loada')
+        else:
+            define = inlineantimony(self.antimony)
+        return define
+
+def sbmltoantimony(sbml):
+    try:
+        transtext = tellurium().sbmlToAntimony(sbml)
+    except Exception as e:
+        transtext = """*********************WARNING*********************
+Failed to translate the SBML model to Antimony string.
+Please check that the SBML file is valid.
+*********************WARNING*********************"""
+        transtext = transtext + "\n\n" + str(e)
+    return transtext
+
+#Converts a SED-ML member with the backend of the action
+def convertsedml(archive, sedmlloc, action):
+    sedmlpath = archive.sedmlpath(sedmlloc)
+    if action == 'c2p':
+        with tracing.stage('sedmlToPython', member=sedmlloc) as span:
+            span.add(sedml=1)
+            return tellurium().sedmlToPython(sedmlpath)
+    with tracing.stage('convertFile', member=sedmlloc) as span:
+        span.add(sedml=1)
+        sedmlstr = phrasedml().convertFile(sedmlpath)
+    sedmlstr = sedmlstr.replace('"compartment"', '"compartment_"')
+    sedmlstr = sedmlstr.replace("'compartment'", "'compartment_'")
+    return sedmlstr
+
+#Builds the script of a SED-ML member from its converted text and models
+#define is a function returned by ModelSet.definer()
+def assemble(action, sedmlstr, sources, define, outputstr):
+    if action == 'c2p':
+        rewriter = LineRewriter([dropsavefig, InlineModels(sources, define)])
+        with tracing.stage('rewrite'):
+            sedmlstr = rewriter.rewrite(sedmlstr)
+        return sedmlstr + '\n\n' + outputstr
+    modelstr = ''
+    for m in range(len(sources)):
+        modelstr += define(modelvariable(m), sources[m][1])[0] + "\n"
+    variables = ', '.join(modelvariable(m) for m in range(len(sources)))
+    return (modelstr + "PhrasedMLstr = '''\n" + sedmlstr +
+            "'''\n\nimport tellurium as te\n\nexp = te.experiment([" + variables + "], [PhrasedMLstr])\nexp.execute(PhrasedMLstr)\n\n" + outputstr)
+
+#Returns the comment closing the scripts generated from an archive
+def footer(action, filename):
+    if action == 'c2p':
+        return '"End of code generated by Import Combine plugin ' + time.strftime("%m/%d/%Y") + '"\n"Extracted from ' + filename + '"\n'
+    return '"End of code generated by Import Combine as PhrasedML plugin ' + time.strftime("%m/%d/%Y") + '"\n"Extracted from ' + filename + '"\n'
+
+#Returns the script standing in for a SED-ML member that failed to translate
+def failedscript(location, message):
+    return ("# *********************WARNING*********************\n"
+            "# Failed to translate " + location + ".\n"
+            "# Please check that the SED-ML file and its models are valid.\n"
+            "# *********************WARNING*********************\n#\n" +
+            ''.join('# ' + line + '\n' for line in message.splitlines()))
+
+#Returns the script standing in for a SED-ML member skipped because some of
+#its files are too large for the memory limit
+def oversizedscript(archive, location, oversized):
+    return ("# *********************WARNING*********************\n"
+            "# Skipped " + location + ": too large for the memory limit.\n"
+            "# Raise memory_limit, or set it to 0, to translate it.\n"
+            "# *********************WARNING*********************\n#\n" +
+            ''.join("# %s is %d bytes uncompressed; converting it takes about "
+                    "%d bytes, above the limit of %d bytes\n"
+                    % (loc, archive.size(loc), archive.size(loc) * EXPANSION,
+                       archive.memorylimit)
+                    for loc in oversized))
+
+def errormessage(e):
+    return ''.join(traceback.format_exception_only(type(e), e)).strip()
+
+#Writes text to path through a temporary file, so readers never see half of it
+def writeatomic(path, text):
+    directory = os.path.dirname(os.path.abspath(path))
+    if not os.path.isdir(directory):
+        try:
+            os.makedirs(directory)
+        except OSError:
+            if not os.path.isdir(directory):
+                raise
+    fd, temppath = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8', newline='') as f:
+            f.write(text)
+        os.replace(temppath, path)
+    except BaseException:
+        os.remove(temppath)
+        raise
+
+def translatearchive(combine, archive, action, modelmode='inline', modeldir=None):
+    """
+    Translate every SED-ML member of an open archive, one after another.
+    The Antimony text of a model is dropped once no remaining member uses it
+    """
+    models = ModelSet(archive, None, modelmode, modeldir)
+    define = models.definer(action)
+    outputstr = footer(action, os.path.basename(combine))
+    sourcelist = [models.sources(sedmlloc) for sedmlloc in archive.sedmlloclist]
+    models.retain(sourcelist)
+    outputstrlist = []
+    for sedmlloc, sources in zip(archive.sedmlloclist, sourcelist):
+        oversized = models.oversized(sedmlloc, sources)
+        if oversized:
+            outputstrlist.append(oversizedscript(archive, sedmlloc, oversized))
+        else:
+            sedmlstr = convertsedml(archive, sedmlloc, action)
+            outputstrlist.append(assemble(action, sedmlstr, sources, define,
+                                          outputstr))
+            del sedmlstr
+        models.release(sources)
+    return outputstrlist
+
+#Translates an open archive through the cache
+def cachedarchive(combine, archive, action, modelmode='inline', modeldir=None):
+    texts = cached(combinekey(action, combine, archive, modelmode, modeldir),
+                   translatearchive, combine, archive, action, modelmode, modeldir)
+    if modelmode == 'sidecar':
+        # Cached scripts may refer to sidecar files deleted since
+        models = ModelSet(archive, None, modelmode, modeldir)
+        sourcelist = [models.sources(sedmlloc) for sedmlloc in archive.sedmlloclist]
+        models.retain(sourcelist)
+        for sedmlloc, sources in zip(archive.sedmlloclist, sourcelist):
+            if not models.oversized(sedmlloc, sources):
+                for source, sbmlloc in sources:
+                    models.sidecar(sbmlloc)
+            models.release(sources)
+    return texts
+
+#Customized from Ipythonify
+def Translatecombine2P(combine, archive=None, usecache=True, modelmode='inline',
+                       modeldir=None):
+    if archive is None:
+        with CombineArchive(combine) as archive:
+            return Translatecombine2P(combine, archive, usecache, modelmode, modeldir)
+    if not usecache:
+        return translatearchive(combine, archive, 'c2p', modelmode, modeldir)
+    return cachedarchive(combine, archive, 'c2p', modelmode, modeldir)
+
+def Translatecombine2WP(combine, archive=None, usecache=True, modelmode='inline',
+                        modeldir=None):
+    if archive is None:
+        with CombineArchive(combine) as archive:
+            return Translatecombine2WP(combine, archive, usecache, modelmode, modeldir)
+    if not usecache:
+        return translatearchive(combine, archive, 'c2pwp', modelmode, modeldir)
+    return cachedarchive(combine, archive, 'c2pwp', modelmode, modeldir)
+
+#Runs in a worker process of Translatecombineparallel. Returns the Antimony
+#text of an SBML member and the trace of the job
+def _antimonyjob(combine, sbmlloc):
+    with tracing.trace('job', member=sbmlloc, pid=os.getpid()) as span:
+        with CombineArchive(combine, locations=([sbmlloc], [])) as archive:
+            text = ModelSet(archive).antimony(sbmlloc)
+    return text, span.todict()
+
+#Runs in a worker process of Translatecombineparallel. locations are the
+#(SBML, SED-ML) lists the parent found, so the archive is not searched again
+def _sedmljob(combine, locations, sedmlloc, action):
+    with tracing.trace('job', member=sedmlloc, pid=os.getpid()) as span:
+        with CombineArchive(combine, locations=locations) as archive:
+            text = convertsedml(archive, sedmlloc, action)
+    return text, span.todict()
+
+def Translatecombineparallel(combine, action, workers=None, usecache=True,
+                             members=None, modelmode='inline', modeldir=None,
+                             memorylimit=None):
+    """
+    Translate the SBML models and SED-ML documents of one archive
+    concurrently over a process pool. Return (texts, errors): texts follows
+    the manifest order of the SED-ML documents, with None for those that
+    failed, and errors is a list of (location, message). The traces of the
+    jobs, and the highest peak memory among them, are attached to the
+    parallel stage
+    """
+    with CombineArchive(combine, memorylimit) as archive:
+        if members is not None:
+            archive.select(members)
+        sedmlloclist = archive.sedmlloclist
+        key = (combinekey(action, combine, archive, modelmode, modeldir)
+               if usecache else None)
+        if key is not None:
+            texts = cacheget(key)
+            if texts is not None:
+                if modelmode == 'sidecar':
+                    return cachedarchive(combine, archive, action, modelmode,
+                                         modeldir), []
+                return texts, []
+        antimony = {}
+        models = ModelSet(archive, antimony, modelmode, modeldir)
+        sourcelist = [models.sources(sedmlloc) for sedmlloc in sedmlloclist]
+        oversizedlist = [models.oversized(sedmlloc, sources)
+                         for sedmlloc, sources in zip(sedmlloclist, sourcelist)]
+        models.retain(sourcelist)
+        sbmlloclist = []
+        for sources, oversized in zip(sourcelist, oversizedlist):
+            if oversized:
+                continue
+            for source, sbmlloc in sources:
+                if sbmlloc not in sbmlloclist and models.needsantimony(sbmlloc):
+                    sbmlloclist.append(sbmlloc)
+        define = models.definer(action)
+        outputstr = footer(action, os.path.basename(combine))
+        texts = []
+        errors = []
+        failed = set()
+        with tracing.stage('parallel', workers=workers) as span:
+            span.add(models=len(sbmlloclist), sedml=len(sedmlloclist))
+
+            def jobdone(job):
+                if span is tracing.NULLSPAN:
+                    # Not traced, e.g. translatefile() called directly
+                    return
+                # The peak memory of this process leaves out the workers
+                span.children.append(job)
+                peak = job['attrs'].get('peak_memory')
+                if peak is not None:
+                    span.attrs['peak_worker_memory'] = max(
+                        span.attrs.get('peak_worker_memory', 0), peak)
+
+            with processpool(workers) as executor:
+                modelfutures = [(sbmlloc, executor.submit(_antimonyjob, combine, sbmlloc))
+                                for sbmlloc in sbmlloclist]
+                sedmlfutures = [None if oversized else
+                                executor.submit(_sedmljob, combine,
+                                                (archive.sbmlloclist, [sedmlloc]),
+                                                sedmlloc, action)
+                                for sedmlloc, oversized in zip(sedmlloclist,
+                                                               oversizedlist)]
+                for sbmlloc, future in modelfutures:
+                    try:
+                        antimony[sbmlloc], job = future.result()
+                        jobdone(job)
+                    except Exception as e:
+                        failed.add(sbmlloc)
+                        errors.append((sbmlloc, errormessage(e)))
+                # Futures keep their results; only antimony holds them now
+                del modelfutures
+                for index, (sedmlloc, sources) in enumerate(zip(sedmlloclist, sourcelist)):
+                    future, sedmlfutures[index] = sedmlfutures[index], None
+                    try:
+                        if future is None:
+                            texts.append(oversizedscript(archive, sedmlloc,
+                                                         oversizedlist[index]))
+                            continue
+                        sedmlstr, job = future.result()
+                        jobdone(job)
+                        for source, sbmlloc in sources:
+                            if sbmlloc in failed:
+                                raise RuntimeError('Model {} could not be translated'.format(sbmlloc))
+                        texts.append(assemble(action, sedmlstr, sources, define,
+                                              outputstr))
+                    except Exception as e:
+                        errors.append((sedmlloc, errormessage(e)))
+                        texts.append(None)
+                    finally:
+                        models.release(sources)
+            span.add(errors=len(errors))
+    if key is not None and not errors:
+        cacheput(key, texts)
+    return texts, errors
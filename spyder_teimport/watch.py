@@ -0,0 +1,143 @@
+# -*- coding:utf-8 -*-
+
+# Copyright © 2017 Kiri Choi
+# Licensed under the terms of the MIT License
+
+"""Incremental re-translation of imported files that change on disk"""
+
+from __future__ import print_function, division
+
+import os
+import hashlib
+
+from .archive import CombineArchive, membername
+from .translate import (ModelSet, Translatesedml2P, Translatesedml2WP,
+                        assemble, convertsedml, footer, modeldirectory,
+                        pythonfilename,
+                        scriptname)
+
+MANIFEST = 'manifest.xml'
+
+
+class WatchedImport(object):
+    """
+    Checksums of the members of an imported file, used to re-translate only
+    the SBML models and SED-ML documents whose bytes changed
+    """
+    def __init__(self, filename, action, members=None, modelmode='inline',
+                 modeldir=None):
+        self.filename = filename
+        self.action = action
+        self.members = members
+        self.modelmode = modelmode
+        self.modeldir = modeldir
+        if modelmode == 'sidecar' and modeldir is None:
+            self.modeldir = modeldirectory(filename)
+        self.digests = None
+        self.antimony = {}
+        self.stat = filestat(filename)
+
+    def modified(self):
+        """Return True if the file changed on disk since the last call"""
+        stat = filestat(self.filename)
+        if stat == self.stat:
+            return False
+        self.stat = stat
+        return True
+
+    def prime(self):
+        """Record the checksums of the file as it was imported"""
+        if self.action == 'c2p' or self.action == 'c2pwp':
+            with CombineArchive(self.filename) as archive:
+                if self.members is not None:
+                    archive.select(self.members)
+                self.digests = archivedigests(archive)
+        else:
+            self.digests = {'': filedigest(self.filename)}
+
+    def update(self):
+        """
+        Re-translate what changed since the last call and return the
+        (name, text) of every script that has to be refreshed
+        """
+        if self.action == 'c2p' or self.action == 'c2pwp':
+            return self._updatearchive()
+        digest = filedigest(self.filename)
+        if self.digests is not None and self.digests.get('') == digest:
+            return []
+        if self.action == 's2p':
+            text = Translatesedml2P(self.filename)
+        else:
+            text = Translatesedml2WP(self.filename)
+        # Only once translated, so that a failure is retried on the next change
+        self.digests = {'': digest}
+        return [(pythonfilename(self.filename, self.action), text)]
+
+    def _updatearchive(self):
+        with CombineArchive(self.filename) as archive:
+            if self.members is not None:
+                archive.select(self.members)
+            digests = archivedigests(archive)
+            previous = self.digests or {}
+            changed = set(name for name, digest in digests.items()
+                          if previous.get(name) != digest)
+            if not changed:
+                return []
+            for sbmlloc in list(self.antimony):
+                if membername(sbmlloc) in changed:
+                    del self.antimony[sbmlloc]
+            models = ModelSet(archive, self.antimony, self.modelmode, self.modeldir)
+            define = models.definer(self.action)
+            outputstr = footer(self.action, os.path.basename(self.filename))
+            results = []
+            for sedmlloc in archive.sedmlloclist:
+                sources = models.sources(sedmlloc)
+                affected = (MANIFEST in changed or membername(sedmlloc) in changed or
+                            any(membername(sbmlloc) in changed
+                                for source, sbmlloc in sources))
+                if not affected:
+                    continue
+                sedmlstr = convertsedml(archive, sedmlloc, self.action)
+                results.append((scriptname(sedmlloc, self.action),
+                                assemble(self.action, sedmlstr, sources,
+                                         define, outputstr)))
+        # Only once translated, so that a failure is retried on the next change
+        self.digests = digests
+        return results
+
+#Runs in a worker process of ImportWatcher: records the checksums of a
+#watched import and returns ([], watched)
+def primewatched(watched):
+    watched.prime()
+    return [], watched
+
+#Runs in a worker process of ImportWatcher: returns the scripts to refresh
+#and the watched import with its new checksums
+def updatewatched(watched):
+    results = watched.update()
+    return results, watched
+
+#Returns what os.stat reports about a file's content, or None if it is gone
+def filestat(filename):
+    try:
+        st = os.stat(filename)
+    except OSError:
+        return None
+    return (st.st_mtime, st.st_size)
+
+def filedigest(filename):
+    h = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+#Returns the checksums of the manifest, SBML and SED-ML members of an archive
+def archivedigests(archive):
+    digests = {}
+    for location in [MANIFEST] + archive.sbmlloclist + archive.sedmlloclist:
+        try:
+            digests[membername(location)] = archive.digest(location)
+        except KeyError:
+            pass
+    return digests
@@ -0,0 +1,365 @@
+# -*- coding:utf-8 -*-
+
+# Copyright © 2017 Kiri Choi
+# Licensed under the terms of the MIT License
+
+"""teImport dock widget panels"""
+
+from __future__ import print_function, division
+
+import os
+import json
+
+from qtpy.QtCore import Qt, QTimer, Signal
+from qtpy.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QPushButton,
+                            QTreeWidget, QTreeWidgetItem, QAbstractItemView,
+                            QDialog, QDialogButtonBox, QLabel, QLineEdit,
+                            QMessageBox)
+from qtpy.compat import getexistingdirectory, getsavefilename
+from spyder.config.base import get_translation
+
+from .export import exportresults
+
+_ = get_translation("teImport", dirname="spyder_teimport")
+
+
+class ScriptsPanel(QWidget):
+    """
+    Lightweight placeholders for generated scripts
+    Only the text is kept; an editor is created when a script is opened
+    """
+    sig_open_script = Signal(str, str, str, str)  # filename, pythonfile, name, text
+
+    def __init__(self, parent=None):
+        super(ScriptsPanel, self).__init__(parent)
+        self.tree = QTreeWidget(self)
+        self.tree.setHeaderLabels([_("Script"), _("Lines")])
+        self.tree.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.tree.itemActivated.connect(self._activated)
+        open_button = QPushButton(_("Open"), self)
+        open_button.clicked.connect(self.open_selected)
+        remove_button = QPushButton(_("Remove"), self)
+        remove_button.clicked.connect(self.remove_selected)
+        export_button = QPushButton(_("Export..."), self)
+        export_button.clicked.connect(self.export_selected)
+        buttons = QHBoxLayout()
+        buttons.addStretch()
+        buttons.addWidget(open_button)
+        buttons.addWidget(export_button)
+        buttons.addWidget(remove_button)
+        layout = QVBoxLayout()
+        layout.addWidget(self.tree)
+        layout.addLayout(buttons)
+        self.setLayout(layout)
+
+    def add_scripts(self, filename, pythonfile, results):
+        """List the (name, text) results translated from filename"""
+        parent = QTreeWidgetItem([os.path.basename(filename), ''])
+        parent.setToolTip(0, filename)
+        for name, text in results:
+            item = QTreeWidgetItem([os.path.basename(name),
+                                    str(text.count('\n') + 1)])
+            item.setData(0, Qt.UserRole, (filename, pythonfile, name, text))
+            parent.addChild(item)
+        self.tree.insertTopLevelItem(0, parent)
+        parent.setExpanded(True)
+        self.tree.resizeColumnToContents(0)
+
+    def update_script(self, filename, name, text):
+        """
+        Replace the text of a script translated from filename; return False
+        if it is not listed
+        """
+        found = False
+        for index in range(self.tree.topLevelItemCount()):
+            parent = self.tree.topLevelItem(index)
+            for child in range(parent.childCount()):
+                item = parent.child(child)
+                data = item.data(0, Qt.UserRole)
+                if data[0] == filename and data[2] == name:
+                    item.setData(0, Qt.UserRole, data[:3] + (text,))
+                    item.setText(1, str(text.count('\n') + 1))
+                    found = True
+        return found
+
+    def _activated(self, item, column=0):
+        data = item.data(0, Qt.UserRole)
+        if data is None:
+            # A source file: open all of its scripts
+            for index in range(item.childCount()):
+                self._activated(item.child(index))
+            return
+        font = item.font(0)
+        font.setItalic(True)
+        item.setFont(0, font)
+        self.sig_open_script.emit(*data)
+
+    def open_selected(self):
+        """Create editors for the selected scripts"""
+        for item in self.tree.selectedItems():
+            self._activated(item)
+
+    def export_selected(self):
+        """
+        Write the selected scripts, or all of them if none is selected, to
+        a directory
+        """
+        items = self.tree.selectedItems()
+        if not items:
+            items = [self.tree.topLevelItem(index)
+                     for index in range(self.tree.topLevelItemCount())]
+        results = []
+        for item in items:
+            children = [item] if item.parent() is not None else \
+                       [item.child(index) for index in range(item.childCount())]
+            for child in children:
+                data = child.data(0, Qt.UserRole)
+                if (data[2], data[3]) not in results:
+                    results.append((data[2], data[3]))
+        if not results:
+            return
+        directory = getexistingdirectory(self, _("Export scripts to"))
+        if not directory:
+            return
+        try:
+            written, skipped = exportresults(results, directory)
+        except (IOError, OSError) as e:
+            QMessageBox.critical(self, _("Export scripts"), str(e))
+            return
+        QMessageBox.information(self, _("Export scripts"),
+                                _("%d scripts written to %s, %d unchanged")
+                                % (len(written), directory, len(skipped)))
+
+    def remove_selected(self):
+        """Drop the selected placeholders"""
+        for item in self.tree.selectedItems():
+            parent = item.parent()
+            if parent is None:
+                self.tree.takeTopLevelItem(self.tree.indexOfTopLevelItem(item))
+            else:
+                parent.removeChild(item)
+                if parent.childCount() == 0:
+                    self.tree.takeTopLevelItem(self.tree.indexOfTopLevelItem(parent))
+
+
+class TracePanel(QWidget):
+    """Timings of the most recent imports, one tree per run_Import batch"""
+    MAXIMUM_TRACES = 50
+
+    def __init__(self, parent=None):
+        super(TracePanel, self).__init__(parent)
+        self.traces = []
+        self.tree = QTreeWidget(self)
+        self.tree.setHeaderLabels([_("Stage"), _("Seconds"), _("Details")])
+        clear_button = QPushButton(_("Clear"), self)
+        clear_button.clicked.connect(self.clear)
+        save_button = QPushButton(_("Save as JSON..."), self)
+        save_button.clicked.connect(self.save)
+        buttons = QHBoxLayout()
+        buttons.addStretch()
+        buttons.addWidget(clear_button)
+        buttons.addWidget(save_button)
+        layout = QVBoxLayout()
+        layout.addWidget(self.tree)
+        layout.addLayout(buttons)
+        self.setLayout(layout)
+
+    def add_trace(self, span):
+        """Show a trace (see tracing.Span.todict) at the top of the tree"""
+        self.traces.append(span)
+        item = self._item(span)
+        self.tree.insertTopLevelItem(0, item)
+        item.setExpanded(True)
+        while len(self.traces) > self.MAXIMUM_TRACES:
+            self.traces.pop(0)
+            self.tree.takeTopLevelItem(self.tree.topLevelItemCount() - 1)
+        for column in range(self.tree.columnCount()):
+            self.tree.resizeColumnToContents(column)
+
+    def _item(self, span):
+        duration = span['duration']
+        details = ', '.join('%s=%s' % (key, formatsize(value) if key.startswith('peak_')
+                                       else value)
+                            for key, value in sorted(span['attrs'].items()))
+        item = QTreeWidgetItem([span['name'],
+                                '' if duration is None else '%.3f' % duration,
+                                details])
+        for child in span['children']:
+            item.addChild(self._item(child))
+        return item
+
+    def clear(self):
+        """Forget every trace"""
+        self.traces = []
+        self.tree.clear()
+
+    def save(self):
+        """Write the traces to a JSON file"""
+        filename, _selfilter = getsavefilename(self, _("Save import timings"),
+                                               'teimport_trace.json',
+                                               'JSON files (*.json)')
+        if filename:
+            with open(filename, 'w') as f:
+                json.dump(self.traces, f, indent=1, sort_keys=True)
+
+
+class LibraryPanel(QWidget):
+    """Search box over the model library index, with import buttons"""
+    sig_import = Signal(object, str)  # {archive: SED-ML locations or None}, action
+    sig_add_directory = Signal(str)
+    sig_rescan = Signal()
+    MAXIMUM_RESULTS = 500
+
+    def __init__(self, parent=None):
+        super(LibraryPanel, self).__init__(parent)
+        self.library = None
+        self.search_edit = QLineEdit(self)
+        self.search_edit.setPlaceholderText(_("Model id, simulation type, file name..."))
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(200)
+        self._timer.timeout.connect(self.search)
+        self.search_edit.textChanged.connect(lambda text: self._timer.start())
+        self.tree = QTreeWidget(self)
+        self.tree.setHeaderLabels([_("Archive"), _("Member"), _("Format"),
+                                   _("Model id"), _("Summary")])
+        self.tree.setRootIsDecorated(False)
+        self.tree.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.tree.itemActivated.connect(lambda item, column: self.import_selected('c2p'))
+        self.status_label = QLabel(self)
+        add_button = QPushButton(_("Add directory..."), self)
+        add_button.clicked.connect(self.add_directory)
+        rescan_button = QPushButton(_("Rescan"), self)
+        rescan_button.clicked.connect(lambda checked=False: self.sig_rescan.emit())
+        c2p_button = QPushButton(_("Import as Python"), self)
+        c2p_button.clicked.connect(lambda checked=False: self.import_selected('c2p'))
+        c2pwp_button = QPushButton(_("Import as PhrasedML"), self)
+        c2pwp_button.clicked.connect(lambda checked=False: self.import_selected('c2pwp'))
+        buttons = QHBoxLayout()
+        buttons.addWidget(add_button)
+        buttons.addWidget(rescan_button)
+        buttons.addStretch()
+        buttons.addWidget(c2p_button)
+        buttons.addWidget(c2pwp_button)
+        layout = QVBoxLayout()
+        layout.addWidget(self.search_edit)
+        layout.addWidget(self.tree)
+        layout.addWidget(self.status_label)
+        layout.addLayout(buttons)
+        self.setLayout(layout)
+
+    def set_status(self, text):
+        self.status_label.setText(text)
+
+    def search(self):
+        """Show the members matching the search box"""
+        self.tree.clear()
+        if self.library is None:
+            return
+        rows = self.library.search(self.search_edit.text(), self.MAXIMUM_RESULTS)
+        for path, location, kind, modelid, summary in rows:
+            item = QTreeWidgetItem([os.path.basename(path), location, kind,
+                                    modelid or '', summary or ''])
+            item.setToolTip(0, path)
+            item.setData(0, Qt.UserRole, (path, location, kind))
+            self.tree.addTopLevelItem(item)
+        for column in range(self.tree.columnCount() - 1):
+            self.tree.resizeColumnToContents(column)
+
+    def add_directory(self):
+        """Ask for a directory of archives to add to the library"""
+        directory = getexistingdirectory(self, _("Add directory to the model library"))
+        if directory:
+            self.sig_add_directory.emit(directory)
+
+    def import_selected(self, action):
+        """
+        Import the selected SED-ML documents, or whole archives for other
+        selected members
+        """
+        selected = {}
+        for item in self.tree.selectedItems():
+            path, location, kind = item.data(0, Qt.UserRole)
+            if kind == 'SED-ML' and selected.get(path, []) is not None:
+                selected.setdefault(path, []).append(location)
+            else:
+                selected[path] = None
+        if selected:
+            self.sig_import.emit(selected, action)
+
+
+class PreviewDialog(QDialog):
+    """
+    SBML and SED-ML members of a COMBINE archive, with their sizes from the
+    zip central directory, and the SED-ML documents to import checked
+    """
+    def __init__(self, filename, entries, parent=None):
+        super(PreviewDialog, self).__init__(parent)
+        self.setWindowTitle(_("Import %s") % os.path.basename(filename))
+        self.tree = QTreeWidget(self)
+        self.tree.setHeaderLabels([_("Member"), _("Format"), _("Size"),
+                                   _("Compressed")])
+        self.tree.setRootIsDecorated(False)
+        for location, kind, size, compressed in entries:
+            item = QTreeWidgetItem([location, kind, formatsize(size),
+                                    formatsize(compressed)])
+            if kind == 'SED-ML':
+                item.setFlags(item.flags() | Qt.ItemIsUserCheckable)
+                item.setCheckState(0, Qt.Checked)
+            else:
+                # Models are imported along with the SED-ML that use them
+                item.setFlags(item.flags() & ~Qt.ItemIsSelectable)
+                item.setDisabled(True)
+            if size is None:
+                item.setToolTip(0, _("Listed in the manifest but missing from the archive"))
+            self.tree.addTopLevelItem(item)
+        for column in range(self.tree.columnCount()):
+            self.tree.resizeColumnToContents(column)
+        self.tree.itemChanged.connect(self._update)
+        all_button = QPushButton(_("Select all"), self)
+        all_button.clicked.connect(lambda checked=False: self._check_all(Qt.Checked))
+        none_button = QPushButton(_("Select none"), self)
+        none_button.clicked.connect(lambda checked=False: self._check_all(Qt.Unchecked))
+        self.buttonbox = QDialogButtonBox(QDialogButtonBox.Ok |
+                                          QDialogButtonBox.Cancel, parent=self)
+        self.buttonbox.accepted.connect(self.accept)
+        self.buttonbox.rejected.connect(self.reject)
+        buttons = QHBoxLayout()
+        buttons.addWidget(all_button)
+        buttons.addWidget(none_button)
+        buttons.addStretch()
+        buttons.addWidget(self.buttonbox)
+        layout = QVBoxLayout()
+        layout.addWidget(QLabel(_("Select the SED-ML documents to import:"), self))
+        layout.addWidget(self.tree)
+        layout.addLayout(buttons)
+        self.setLayout(layout)
+        self.resize(600, 400)
+
+    def _items(self):
+        for index in range(self.tree.topLevelItemCount()):
+            item = self.tree.topLevelItem(index)
+            if item.flags() & Qt.ItemIsUserCheckable:
+                yield item
+
+    def _check_all(self, state):
+        for item in self._items():
+            item.setCheckState(0, state)
+
+    def _update(self, item=None, column=0):
+        self.buttonbox.button(QDialogButtonBox.Ok).setEnabled(bool(self.selected()))
+
+    def selected(self):
+        """Return the locations of the checked SED-ML documents"""
+        return [item.text(0) for item in self._items()
+                if item.checkState(0) == Qt.Checked]
+
+#Returns a byte count in human readable form
+def formatsize(size):
+    if size is None:
+        return ''
+    for unit in ('B', 'kB', 'MB'):
+        if size < 1024:
+            return '%.0f %s' % (size, unit) if unit == 'B' else '%.1f %s' % (size, unit)
+        size /= 1024.
+    return '%.1f GB' % size
@@ -0,0 +1,427 @@
+# -*- coding:utf-8 -*-
+
+# Copyright © 2017 Kiri Choi
+# Licensed under the terms of the MIT License
+
+"""Background translation worker"""
+
+from __future__ import print_function, division
+
+import os
+import shutil
+import tempfile
+import functools
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from qtpy.QtCore import QObject, QTimer, Qt, Signal
+
+from .archive import CombineArchive
+from .backends import loadall
+from .batch import convert
+from .runner import runfile, runnerinit
+from .translate import processpool, tracedtranslatefile
+from .watch import WatchedImport, primewatched, updatewatched
+
+
+class TranslationWorker(QObject):
+    """
+    Run translations in a process pool off the GUI thread
+    Results are delivered through Qt signals, which are queued to the main
+    thread, so editors can be created there as each file finishes
+    """
+    sig_progress = Signal(str, int, int)               # filename, done, total
+    sig_translated = Signal(str, str, object, object)  # filename, pythonfile, results, trace
+    sig_failed = Signal(str, str)                      # filename, error message
+    sig_finished = Signal()
+    sig_prewarmed = Signal(object)                     # trace of the backend imports
+    _sig_done = Signal(int, str, str, object)
+    _sig_prewarm_done = Signal(object)
+
+    def __init__(self, parent=None, workers=None):
+        super(TranslationWorker, self).__init__(parent)
+        self._sig_done.connect(self._on_done, Qt.QueuedConnection)
+        self._sig_prewarm_done.connect(self._on_prewarmed, Qt.QueuedConnection)
+        self.workers = workers or os.cpu_count() or 1
+        self._executor = None
+        self._futures = []
+        self._generation = 0
+        self._done = 0
+        self._total = 0
+
+    def is_running(self):
+        """Return True if a batch is still being translated"""
+        return self._done < self._total
+
+    def _getexecutor(self):
+        if self._executor is None:
+            self._executor = processpool(self.workers)
+        return self._executor
+
+    def prewarm(self):
+        """Start the worker processes and import the backends in them"""
+        executor = self._getexecutor()
+        for i in range(self.workers):
+            future = executor.submit(loadall)
+            future.add_done_callback(self._sig_prewarm_done.emit)
+
+    def _on_prewarmed(self, future):
+        # Queued from the executor's thread, so this runs on the GUI thread
+        try:
+            trace = future.result()
+        except Exception:
+            # The import is tried again, and reported, on the first translation
+            return
+        if trace['children']:
+            self.sig_prewarmed.emit(trace)
+
+    def start(self, jobs, action, usecache=True, members=None, modelmode='inline',
+              memorylimit=None, memberworkers=None):
+        """
+        Submit (filename, pythonfile) jobs for translation; while a batch
+        is running, they are added to it
+        members optionally maps archives to the SED-ML locations to translate.
+        With memberworkers > 1, the members of each archive are translated
+        concurrently in that many extra processes
+        """
+        executor = self._getexecutor()
+        if not self.is_running():
+            self._generation += 1
+            self._futures = []
+            self._done = self._total = 0
+        self._total += len(jobs)
+        for filename, pythonfile in jobs:
+            future = executor.submit(tracedtranslatefile, filename, action,
+                                     usecache, memberworkers,
+                                     (members or {}).get(filename), modelmode,
+                                     None, memorylimit)
+            future.add_done_callback(functools.partial(self._sig_done.emit,
+                                                       self._generation,
+                                                       filename, pythonfile))
+            self._futures.append(future)
+        if not self._total:
+            self.sig_finished.emit()
+
+    def cancel(self):
+        """Drop pending jobs and ignore the results of running ones"""
+        for future in self._futures:
+            future.cancel()
+        self._futures = []
+        self._generation += 1
+        if self.is_running():
+            self._done = self._total = 0
+            self.sig_finished.emit()
+
+    def shutdown(self):
+        """Cancel everything and stop the worker processes"""
+        self.cancel()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def _on_done(self, generation, filename, pythonfile, future):
+        # Queued from the executor's thread, so this runs on the GUI thread
+        if generation != self._generation or future.cancelled():
+            return
+        try:
+            results, trace = future.result()
+        except Exception as e:
+            message = ''.join(traceback.format_exception_only(type(e), e))
+            self.sig_failed.emit(filename, message.strip())
+        else:
+            self.sig_translated.emit(filename, pythonfile, results, trace)
+        self._done += 1
+        self.sig_progress.emit(filename, self._done, self._total)
+        if self._done == self._total:
+            self.sig_finished.emit()
+
+
+
+class ImportWatcher(QObject):
+    """
+    Poll imported files for changes and re-translate the members that
+    changed in a worker process. The WatchedImport is sent to the process
+    and comes back with its updated checksums
+    """
+    sig_updated = Signal(str, object)  # filename, [(name, text)]
+    sig_failed = Signal(str, str)      # filename, error message
+    _sig_done = Signal(str, object)
+
+    def __init__(self, parent=None, interval=2000):
+        super(ImportWatcher, self).__init__(parent)
+        self._sig_done.connect(self._on_done, Qt.QueuedConnection)
+        self._watched = {}
+        self._busy = {}
+        self._executor = None
+        self._timer = QTimer(self)
+        self._timer.setInterval(interval)
+        self._timer.timeout.connect(self._poll)
+
+    def watch(self, filename, action, members=None, modelmode='inline'):
+        """Start watching a file that was just imported with action"""
+        watched = WatchedImport(filename, action, members, modelmode)
+        self._watched[filename] = watched
+        self._submit(filename, primewatched)
+        if not self._timer.isActive():
+            self._timer.start()
+
+    def unwatch(self, filename):
+        """Stop watching a file"""
+        self._watched.pop(filename, None)
+        if not self._watched:
+            self._timer.stop()
+
+    def unwatch_all(self):
+        """Stop watching every file"""
+        self._watched = {}
+        self._timer.stop()
+
+    def watched(self):
+        """Return the names of the watched files"""
+        return sorted(self._watched)
+
+    def shutdown(self):
+        """Stop polling and the worker process"""
+        self.unwatch_all()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def _poll(self):
+        for filename, watched in list(self._watched.items()):
+            if filename in self._busy or not watched.modified():
+                continue
+            if watched.stat is None:
+                # Deleted or being rewritten; look again on the next tick
+                continue
+            self._submit(filename, updatewatched)
+
+    def _submit(self, filename, func):
+        if self._executor is None:
+            self._executor = processpool(1)
+        watched = self._watched[filename]
+        self._busy[filename] = watched
+        future = self._executor.submit(func, watched)
+        future.add_done_callback(functools.partial(self._sig_done.emit, filename))
+
+    def _on_done(self, filename, future):
+        # Queued from the executor's thread, so this runs on the GUI thread
+        submitted = self._busy.pop(filename, None)
+        if submitted is None or self._watched.get(filename) is not submitted:
+            # Unwatched, or watched again, in the meantime
+            return
+        try:
+            results, watched = future.result()
+        except Exception as e:
+            message = ''.join(traceback.format_exception_only(type(e), e))
+            self.sig_failed.emit(filename, message.strip())
+            return
+        self._watched[filename] = watched
+        if results:
+            self.sig_updated.emit(filename, results)
+
+
+class ArchivePreviewer(QObject):
+    """
+    Read the members of archives to preview in a background thread: finding
+    the members the manifest leaves out decompresses their first bytes
+    """
+    sig_previewed = Signal(object, object)  # [(filename, pythonfile, entries, count)], context
+    _sig_done = Signal(object, object)
+
+    def __init__(self, parent=None):
+        super(ArchivePreviewer, self).__init__(parent)
+        self._sig_done.connect(self._on_done, Qt.QueuedConnection)
+        self._executor = ThreadPoolExecutor(max_workers=1)
+
+    def preview(self, jobs, context=None):
+        """
+        Read the (filename, pythonfile) jobs; context is passed back with
+        the result
+        """
+        future = self._executor.submit(previewjobs, jobs)
+        future.add_done_callback(functools.partial(self._sig_done.emit, context))
+
+    def shutdown(self):
+        """Stop the background thread once the current archive is read"""
+        self._executor.shutdown(wait=False)
+
+    def _on_done(self, context, future):
+        # Queued from the previewer's thread, so this runs on the GUI thread
+        self.sig_previewed.emit(future.result(), context)
+
+
+class LibraryScanner(QObject):
+    """Update a model library index in a background thread"""
+    sig_progress = Signal(str, int, int)  # archive, done, total
+    sig_finished = Signal(object)         # (indexed, unchanged, removed)
+    sig_failed = Signal(str)              # error message
+    _sig_done = Signal(object)
+
+    def __init__(self, parent=None):
+        super(LibraryScanner, self).__init__(parent)
+        self._sig_done.connect(self._on_done, Qt.QueuedConnection)
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._future = None
+
+    def is_running(self):
+        """Return True if a scan is in progress"""
+        return self._future is not None
+
+    def scan(self, library, directories):
+        """Index directories into library unless a scan is already running"""
+        if self._future is not None:
+            return
+        self._future = self._executor.submit(library.scan, directories,
+                                             self.sig_progress.emit)
+        self._future.add_done_callback(self._sig_done.emit)
+
+    def shutdown(self):
+        """Stop the background thread once the current archive is indexed"""
+        self._executor.shutdown(wait=False)
+
+    def _on_done(self, future):
+        # Queued from the scanner's thread, so this runs on the GUI thread
+        self._future = None
+        try:
+            counts = future.result()
+        except Exception as e:
+            message = ''.join(traceback.format_exception_only(type(e), e))
+            self.sig_failed.emit(message.strip())
+        else:
+            self.sig_finished.emit(counts)
+
+
+class ExperimentRunner(QObject):
+    """
+    Translate and execute imported files in their own process pool, one
+    file per process, so several experiments run at once without blocking
+    the console. Result arrays come back as memory-mapped .npy files
+    """
+    sig_ran = Signal(str, str, object, object, object)  # filename, action, results, trace, runs
+    sig_failed = Signal(str, str)                  # filename, error message
+    _sig_done = Signal(str, str, object)
+
+    def __init__(self, parent=None, workers=None):
+        super(ExperimentRunner, self).__init__(parent)
+        self._sig_done.connect(self._on_done, Qt.QueuedConnection)
+        self.workers = workers or os.cpu_count() or 1
+        self._executor = None
+        self._directory = None
+        self._count = 0
+        self._running = 0
+
+    def is_running(self):
+        """Return True if experiments are still running"""
+        return self._running > 0
+
+    def start(self, jobs, usecache=True, modelmode='inline', memorylimit=None):
+        """Submit (filename, action) jobs to translate and run"""
+        if self._executor is None:
+            self._executor = processpool(self.workers, runnerinit)
+        if self._directory is None:
+            self._directory = tempfile.mkdtemp(prefix='teimport-run-')
+        for filename, action in jobs:
+            self._count += 1
+            self._running += 1
+            directory = os.path.join(self._directory, str(self._count))
+            future = self._executor.submit(runfile, filename, action, directory,
+                                           usecache, modelmode, memorylimit)
+            future.add_done_callback(functools.partial(self._sig_done.emit,
+                                                       filename, action))
+
+    def shutdown(self):
+        """Stop the worker processes and remove the result files"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        if self._directory is not None:
+            # Consoles may still map the arrays; on Windows they stay until
+            # the next cleanup of the temporary directory
+            shutil.rmtree(self._directory, ignore_errors=True)
+            self._directory = None
+
+    def _on_done(self, filename, action, future):
+        # Queued from the executor's thread, so this runs on the GUI thread
+        self._running -= 1
+        try:
+            results, trace, runs = future.result()
+        except Exception as e:
+            message = ''.join(traceback.format_exception_only(type(e), e))
+            self.sig_failed.emit(filename, message.strip())
+        else:
+            self.sig_ran.emit(filename, action, results, trace, runs)
+
+
+class ScriptExporter(QObject):
+    """
+    Translate files and write their scripts to a directory with
+    batch.convert, without creating editors, in a background thread
+    """
+    sig_progress = Signal(str, int, int)  # filename, done, total
+    sig_finished = Signal(object)         # [BatchSummary]
+    sig_failed = Signal(str)              # error message
+    _sig_done = Signal(object)
+
+    def __init__(self, parent=None, workers=None):
+        super(ScriptExporter, self).__init__(parent)
+        self._sig_done.connect(self._on_done, Qt.QueuedConnection)
+        self.workers = workers or os.cpu_count() or 1
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._future = None
+
+    def is_running(self):
+        """Return True if an export is in progress"""
+        return self._future is not None
+
+    def export(self, groups, outdir, usecache=True, modelmode='inline',
+               memorylimit=None):
+        """Export the inputs of groups, which maps actions to file lists"""
+        if self._future is not None:
+            return
+        self._future = self._executor.submit(self._export, groups, outdir,
+                                             usecache, modelmode, memorylimit)
+        self._future.add_done_callback(self._sig_done.emit)
+
+    def _export(self, groups, outdir, usecache, modelmode, memorylimit):
+        total = sum(len(inputs) for inputs in groups.values())
+        done = [0]
+
+        def progress(inputfile, error):
+            done[0] += 1
+            self.sig_progress.emit(inputfile, done[0], total)
+
+        # Always over the pool, so Tellurium is never loaded into Spyder
+        return [convert(inputs, action, outdir, self.workers, usecache,
+                        progress, modelmode=modelmode, memorylimit=memorylimit,
+                        inprocess=False)
+                for action, inputs in sorted(groups.items())]
+
+    def shutdown(self):
+        """Stop the background thread once the current export is done"""
+        self._executor.shutdown(wait=False)
+
+    def _on_done(self, future):
+        # Queued from the exporter's thread, so this runs on the GUI thread
+        self._future = None
+        try:
+            summaries = future.result()
+        except Exception as e:
+            message = ''.join(traceback.format_exception_only(type(e), e))
+            self.sig_failed.emit(message.strip())
+        else:
+            self.sig_finished.emit(summaries)
+
+#Runs in the thread of ArchivePreviewer: returns (filename, pythonfile,
+#entries, number of SED-ML documents) for each job, with None entries for
+#archives that cannot be read
+def previewjobs(jobs):
+    previews = []
+    for filename, pythonfile in jobs:
+        try:
+            with CombineArchive(filename) as archive:
+                previews.append((filename, pythonfile, archive.entries(),
+                                 len(archive.sedmlloclist)))
+        except Exception:
+            previews.append((filename, pythonfile, None, 0))
+    return previews
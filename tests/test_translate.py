@@ -0,0 +1,30 @@
+# -*- coding:utf-8 -*-
+
+# Copyright © 2017 Kiri Choi
+# Licensed under the terms of the MIT License
+
+"""Tests of the translation of COMBINE archives outside of Spyder"""
+
+from __future__ import print_function, division
+
+import os, sys
+
+import pytest
+
+pytest.importorskip('tellurium')
+pytest.importorskip('phrasedml')
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'benchmarks'))
+
+import corpus
+from spyder_teimport.translate import translatefile
+
+
+def test_untraced_parallel_archive(tmp_path):
+    # Member jobs without an active trace have nowhere to attach their own
+    archive = corpus.makearchive(str(tmp_path / 'parallel.omex'), 2, 5, 3, 0)
+    results = translatefile(archive, 'c2p', usecache=False, workers=2)
+    assert [name for name, text in results] == ['sim0.py', 'sim1.py', 'sim2.py']
+    for name, text in results:
+        assert 'Failed to translate' not in text